@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from kline_decoder import Kline
+
+# Klines endpoint of the futures testnet the live scripts stream from.
+REST_URL = "https://testnet.binancefuture.com/fapi/v1/klines"
+# Most klines one request may return.
+MAX_LIMIT = 1500
+
+INTERVAL_UNITS_MS = {'s': 1000, 'm': 60_000, 'h': 3_600_000, 'd': 86_400_000, 'w': 604_800_000}
+
+
+def interval_ms(interval):
+    """Length of a kline interval such as '1m' or '4h' in milliseconds."""
+    return int(interval[:-1]) * INTERVAL_UNITS_MS[interval[-1]]
+
+
+def parse_klines(rows, symbol):
+    """Converts REST kline arrays [open time, o, h, l, c, v, close time, ...] into closed Klines."""
+    return [Kline(symbol.upper(), int(row[0]), int(row[6]), float(row[1]), float(row[2]), float(row[3]),
+                  float(row[4]), float(row[5]), True) for row in rows]
+
+
+def fetch_page(url, symbol, interval, start_time, limit, timeout=10):
+    """Requests one page of klines starting at start_time."""
+    query = urllib.parse.urlencode({'symbol': symbol.upper(), 'interval': interval, 'startTime': start_time,
+                                    'limit': limit})
+    with urllib.request.urlopen(f"{url}?{query}", timeout=timeout) as response:
+        return json.load(response)
+
+
+def fetch_klines(symbol, interval, count, url=REST_URL, end_time=None, workers=4, limit=MAX_LIMIT):
+    """Fetches the last count closed klines before end_time (now by default).
+
+    The range is split into pages of limit klines that are requested concurrently, then
+    merged in open-time order. The candle still forming at end_time is left out.
+    """
+    step = interval_ms(interval)
+    end_time = int(time.time() * 1000) if end_time is None else end_time
+    last_open = end_time // step * step - step  # Open time of the last candle closed by end_time
+    first_open = last_open - (count - 1) * step
+    starts = range(first_open, last_open + 1, limit * step)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pages = pool.map(lambda start: fetch_page(url, symbol, interval, start, min(limit, count)), starts)
+        rows = {row[0]: row for page in pages for row in page if first_open <= row[0] <= last_open}
+    return parse_klines([rows[open_time] for open_time in sorted(rows)], symbol)
+
+
+def read_klines(path, symbol, count=None):
+    """Reads klines saved by this module's CLI: a JSON array of REST kline arrays."""
+    with open(path) as saved:
+        rows = json.load(saved)
+    rows.sort(key=lambda row: row[0])
+    return parse_klines(rows[-count:] if count else rows, symbol)
+
+
+def candles_since(interval, open_time, end_time=None):
+    """Number of candles closed by end_time (now by default) after the one opened at open_time."""
+    step = interval_ms(interval)
+    end_time = int(time.time() * 1000) if end_time is None else end_time
+    return max(0, (end_time // step * step - step - open_time) // step)
+
+
+def load_backfill(source, symbol, interval, count, since=None):
+    """Klines from a saved file when source is a path, otherwise from the REST endpoint at source.
+
+    With since, only the candles opened after that open time are returned (at most the
+    last count of them), e.g. to fill the gap left by a restart or reconnect. Returns an
+    empty list, after printing why, when the history cannot be loaded, so the bot
+    still starts, only without a warm-up.
+    """
+    if not source or not count:
+        return []
+    try:
+        if os.path.exists(source):
+            klines = read_klines(source, symbol)
+            if since is not None:
+                klines = [kline for kline in klines if kline.open_time > since]
+            return klines[-count:]
+        if since is not None:
+            count = min(count, candles_since(interval, since))
+            if not count:
+                return []
+        return fetch_klines(symbol, interval, count, source)
+    except (OSError, ValueError) as error:
+        print(f"Backfill from {source} failed: {error}")
+        return []
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Saves recent klines to a file the live scripts can backfill from.")
+    parser.add_argument("symbol")
+    parser.add_argument("interval")
+    parser.add_argument("count", type=int)
+    parser.add_argument("output")
+    parser.add_argument("--url", default=REST_URL)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    klines = fetch_klines(args.symbol, args.interval, args.count, args.url, workers=args.workers)
+    with open(args.output, 'w') as output:
+        json.dump([[kline.open_time, str(kline.open), str(kline.high), str(kline.low), str(kline.close),
+                    str(kline.volume), kline.close_time] for kline in klines], output)
+    print(f"Saved {len(klines)} {args.symbol} {args.interval} klines to {args.output}")
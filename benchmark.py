@@ -0,0 +1,275 @@
+import argparse
+import contextlib
+import importlib
+import itertools
+import json
+import math
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from indicators import MovingAverages
+
+# Timings depend on the machine, so results stay local (the directory is git-ignored); compare runs made on one machine.
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_results")
+DEFAULT_SIZES = [1_000, 100_000, 1_000_000, 10_000_000]
+# Number of on_message calls timed on top of a history of the given size.
+MESSAGES_PER_RUN = 200
+MAX_REPEAT = 20
+
+
+def synthetic_ohlcv(rows, seed=0):
+    """Random-walk 1m OHLCV candles in the layout of the live scripts and the backtest CSVs."""
+    rng = np.random.default_rng(seed)
+    close = np.round(30000 + np.cumsum(rng.normal(0, 5, rows)), 2)
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    spread = np.abs(rng.normal(0, 3, rows))
+    timestamp = 1_600_000_000_000 + np.arange(rows, dtype=np.int64) * 60_000
+    return pd.DataFrame({
+        'timestamp': timestamp,
+        'datetime': pd.to_datetime(timestamp, unit='ms'),
+        'pair': 'BTCUSDT',
+        'o': open_,
+        'h': np.maximum(open_, close) + spread,
+        'l': np.minimum(open_, close) - spread,
+        'c': close,
+        'v': np.round(rng.exponential(10, rows), 3),
+    })
+
+
+def kline_frames(frame, start, count):
+    """Raw kline frames continuing the synthetic candles, each one a closed candle."""
+    frames = []
+    for i in range(start, start + count):
+        t = 1_600_000_000_000 + i * 60_000
+        price = f"{30000 + (i % 1000) * 0.5:.2f}"
+        frames.append(json.dumps({
+            "e": "kline", "E": t + 59_999, "s": "BTCUSDT",
+            "k": {"t": t, "T": t + 59_999, "s": "BTCUSDT", "i": "1m", "o": price, "c": price, "h": price,
+                  "l": price, "v": "1.0", "x": True},
+        }))
+    return frames
+
+
+# --------------------------------------------------------------------
+# Set-ups: each takes the synthetic frame and returns the callable to time.
+# --------------------------------------------------------------------
+def bench_v2_calculate_moving_averages(frame):
+    live = importlib.import_module("binance_ohlcv_v2")
+    data = frame[['c']].copy()
+    return lambda: live.calculate_moving_averages(data, [5, 10])
+
+
+def bench_v3_calculate_ma_crossover(frame):
+    live = importlib.import_module("binance_ohlcv_v3")
+    data = frame[['c']].copy()
+    return lambda: live.calculate_ma_crossover(data, 5, 10)
+
+
+def bench_v5_calculate_crossover(frame):
+    live = importlib.import_module("binance_ohlcv_v5")
+    data = frame[['c']].copy()
+    return lambda: live.calculate_crossover(data, 5, 10)
+
+
+def bench_incremental_moving_averages(frame):
+    close = frame['c'].tolist()
+
+    def run():
+        moving_averages = MovingAverages([5, 10])
+        for price in close:
+            moving_averages.update(price)
+    return run
+
+
+def bench_v5_calculate_portfolio_balance(frame):
+    live = importlib.reload(importlib.import_module("binance_ohlcv_v5"))
+    data = frame[['c']].copy()
+    live.calculate_crossover(data, 5, 10)
+    rows = data.to_dict('records')
+
+    def run():
+        live.ledger.usd_balance, live.ledger.btc_balance = 10000.0, 1.0
+        for row in rows:
+            live.calculate_portfolio_balance(row)
+    return run
+
+
+def _live_script(version, frame, data_dir, stream):
+    """Loads a live script wired by its own setup(), with frame already ingested as closed candles."""
+    live = importlib.reload(importlib.import_module(f"binance_ohlcv_{version}"))
+    live.setup(data_dir, stream=stream)
+
+    columns = [name for name in live.candles.columns if name in frame]
+    for row in frame[columns].itertuples(index=False):
+        live.ingestor.ingest(row._asdict(), True)
+    live.persister.position = live.candles.appended
+    return live
+
+
+def bench_on_message(version):
+    def setup(frame):
+        data_dir = tempfile.TemporaryDirectory(prefix="bench-")
+        stream = open(os.devnull, 'w')
+        live = _live_script(version, frame, data_dir.name, stream)
+        # The stream continues after the history, so every timed message appends a new candle.
+        messages = iter(kline_frames(frame, len(frame), MESSAGES_PER_RUN * MAX_REPEAT))
+
+        def run():
+            for message in itertools.islice(messages, MESSAGES_PER_RUN):
+                live.on_message(None, message)
+            live.pipeline.join()
+
+        def close():
+            # Stops the pipeline, persister and writer threads before their files are removed.
+            live.pipeline.close()
+            live.persister.close()
+            live.writer.close()
+            stream.close()
+            data_dir.cleanup()
+        run.close = close
+        return run
+    return setup
+
+
+def bench_calculate_moving_averages(frame):
+    bot = importlib.import_module("simulated_trading_bot")
+    data = frame[['datetime', 'c']].copy()
+    return lambda: bot.calculateMovingAverages(data, 13, 48)
+
+
+def bench_identify_signals(frame):
+    bot = importlib.import_module("simulated_trading_bot")
+    data = frame[['datetime', 'c']].copy()
+    bot.calculateMovingAverages(data, 13, 48)
+    return lambda: bot.identifySignals(data)
+
+
+def bench_trade(frame):
+    bot = importlib.import_module("simulated_trading_bot")
+    data = frame[['datetime', 'c']].copy()
+    bot.calculateMovingAverages(data, 13, 48)
+    bot.identifySignals(data)
+    return lambda: bot.Trade(data, 10000.0)
+
+
+# name -> (set-up, largest size it is run at); pure Python per-row paths are capped.
+BENCHMARKS = {
+    'v2.calculate_moving_averages': (bench_v2_calculate_moving_averages, None),
+    'v3.calculate_ma_crossover': (bench_v3_calculate_ma_crossover, None),
+    'v5.calculate_crossover': (bench_v5_calculate_crossover, None),
+    'indicators.MovingAverages.update': (bench_incremental_moving_averages, 1_000_000),
+    'v5.calculate_portfolio_balance': (bench_v5_calculate_portfolio_balance, 1_000_000),
+    'v1.on_message': (bench_on_message("v1"), 100_000),
+    'v2.on_message': (bench_on_message("v2"), 100_000),
+    'v3.on_message': (bench_on_message("v3"), 100_000),
+    'v4.on_message': (bench_on_message("v4"), 100_000),
+    'v5.on_message': (bench_on_message("v5"), 100_000),
+    'simulated_trading_bot.calculateMovingAverages': (bench_calculate_moving_averages, None),
+    'simulated_trading_bot.identifySignals': (bench_identify_signals, None),
+    'simulated_trading_bot.Trade': (bench_trade, None),
+}
+
+
+def run_benchmarks(names, sizes, repeat):
+    """Times every benchmark at every size; returns {name: {size: best seconds}}.
+
+    A benchmark whose setup leaves threads or files behind gives its function a close()
+    that is called after the timings.
+    """
+    results = {}
+    for size in sizes:
+        frame = synthetic_ohlcv(size)
+        for name in names:
+            setup, max_size = BENCHMARKS[name]
+            if max_size is not None and size > max_size:
+                continue
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                function = setup(frame)
+                timings = []
+                try:
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        function()
+                        timings.append(time.perf_counter() - start)
+                finally:
+                    if hasattr(function, 'close'):
+                        function.close()
+            results.setdefault(name, {})[size] = min(timings)
+            print(f"{name:<48} {size:>10,} rows {min(timings) * 1000:>12.3f} ms")
+    return results
+
+
+def scaling_exponents(timings):
+    """Growth exponent between consecutive sizes: ~1 is linear, ~2 quadratic, ~0 flat."""
+    sizes = sorted(timings)
+    return {
+        f"{small}->{large}": math.log(timings[large] / timings[small]) / math.log(large / small)
+        for small, large in zip(sizes, sizes[1:])
+        if timings[small] > 0
+    }
+
+
+def current_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save_results(results, commit):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{commit}.json")
+    with open(path, 'w') as output:
+        json.dump({
+            'commit': commit,
+            'date': time.strftime("%Y-%m-%d %H:%M:%S"),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'results': {name: {str(size): seconds for size, seconds in timings.items()}
+                        for name, timings in results.items()},
+        }, output, indent=2)
+    return path
+
+
+def compare(results, baseline_commit):
+    """Prints the speed-up of every timing against the results saved for another commit."""
+    with open(os.path.join(RESULTS_DIR, f"{baseline_commit}.json")) as baseline_file:
+        baseline = json.load(baseline_file)['results']
+    print(f"\nCompared with {baseline_commit} (>1 is faster now)")
+    for name, timings in results.items():
+        for size, seconds in timings.items():
+            before = baseline.get(name, {}).get(str(size))
+            if before:
+                print(f"{name:<48} {size:>10,} rows {before / seconds:>8.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the indicator, ingest and backtest hot paths.")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help="comma separated row counts, e.g. 1000,100000,1000000,10000000")
+    parser.add_argument("--only", help="run only benchmarks whose name contains this text")
+    parser.add_argument("--repeat", type=int, default=3, choices=range(1, MAX_REPEAT + 1), metavar="N")
+    parser.add_argument("--compare", metavar="COMMIT", help="compare with the saved results of COMMIT")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    names = [name for name in BENCHMARKS if not args.only or args.only in name]
+    sizes = [int(size) for size in args.sizes.split(",")]
+    results = run_benchmarks(names, sizes, args.repeat)
+
+    print("\nScaling exponents (1 = linear, 2 = quadratic)")
+    for name, timings in results.items():
+        exponents = ", ".join(f"{step}: {value:.2f}" for step, value in scaling_exponents(timings).items())
+        print(f"{name:<48} {exponents}")
+
+    if not args.no_save:
+        print(f"\nResults saved to {save_results(results, current_commit())}")
+    if args.compare:
+        compare(results, args.compare)
@@ -1,35 +1,63 @@
 import websocket
-import json
-import pandas as pd
+import os
 import signal
 import sys
+from candle_schema import candle_columns
+from candle_store import CandleStore
+from history_store import HistoryStore
+from kline_ingest import KlineIngestor
+from metrics import Metrics
+from output_writer import OutputWriter
+from persistence import CandlePersister
+from pipeline import FramePipeline
 
-# Initializing an empty DataFrame to store incoming data.
-df = pd.DataFrame(columns=['timestamp', 'pair', 'o', 'h', 'l', 'c', 'v'])
+# Initializing an empty columnar store for incoming data.
+# Closed candles are persisted, so only the newest 10,000 rows are kept in memory.
+# Prices and volumes are stored as price_dtype ('float32' halves them), the pair as a categorical.
+price_dtype = 'float64'
+candles = CandleStore(candle_columns(price_dtype=price_dtype), capacity=10_000)
+# Latency of each on_message stage and message/drop counters.
+metrics = Metrics()
+metrics.gauge('candle_store_bytes', candles.nbytes)
+# Updates of the forming candle overwrite its row until the candle closes.
+ingestor = KlineIngestor(candles, metrics=metrics)
 
+# Define the cryptocurrency pair symbol and candle interval.
+symbol = "BTCUSDT"
+interval = "1m"
+# 'every' prints each update, 'closed' only closed candles, 'rate' at most max_lines_per_sec lines.
+output_mode = 'every'
+max_lines_per_sec = None
+# Frames wait in a bounded queue; when it is full 'block' waits, 'drop_oldest' discards
+# the oldest frame and 'coalesce' also skips superseded updates of a forming candle.
+pipeline_policy = 'block'
 
-# Handles incoming WebSocket messages by appending them to the DataFrame.
+
+# Handles incoming WebSocket messages by appending them to the candle store.
 def on_message(ws, message):
-    global df
-    message_data = json.loads(message)
+    # The receive thread only queues the frame; it is decoded and stored on the pipeline worker.
+    metrics.count('messages')
+    pipeline.put(message)
+
 
+# Stores a decoded kline in the candle store.
+def on_kline(kline):
     data = {
-        'timestamp': [message_data['k']['t']],
-        'pair': [message_data['s']],
-        'o': [message_data['k']['o']],
-        'h': [message_data['k']['h']],
-        'l': [message_data['k']['l']],
-        'c': [message_data['k']['c']],
-        'v': [message_data['k']['v']],
+        'timestamp': kline.open_time,
+        'pair': kline.symbol,
+        'o': kline.open,
+        'h': kline.high,
+        'l': kline.low,
+        'c': kline.close,
+        'v': kline.volume,
     }
-    new_row = pd.DataFrame(data)
-    if df.empty:
-        # If the DataFrame is empty, print column names with the first row.
-        print(new_row.to_string(index=False, header=True))
-    else:
-        # For subsequent rows, print without column names or an index.
-        print(new_row.to_string(index=False, header=False))
-    df = pd.concat([df, new_row], ignore_index=True)
+    with metrics.time('store'):
+        ingestor.ingest(data, kline.closed)
+    with metrics.time('persist'):
+        persister.collect(candles, ingestor.closed)
+    # Rows are printed by a background writer, the first one with column names.
+    with metrics.time('output'):
+        writer.write(candles.last(), ingestor.closed)
 
 # Handles errors by printing them.
 def on_error(ws, error):
@@ -38,11 +66,12 @@ def on_error(ws, error):
 
 # Handles the closing of the WebSocket connection.
 def on_close(ws, *args, **kwargs):
-    global df
     print("Connection closed")
-    csv_file_path = r"C:/Users/Reilly Decker/Desktop/websocket_test_v1.csv"
-    df.to_csv(csv_file_path, index=False)
-    print(f"DataFrame saved to {csv_file_path}")
+    pipeline.close()
+    # Only the rows not flushed yet are written here.
+    persister.close()
+    writer.close()
+    print(f"Candles saved to {persister.root}")
 
 
 # Notifies when the WebSocket connection is successfully opened.
@@ -51,8 +80,8 @@ def on_open(ws):
 
 
 # Subscribes to a specific Binance kline stream based on symbol and interval.
-def subscribe_to_stream(symbol, interval):
-    ws_url = f"wss://stream.binancefuture.com/ws/{symbol.lower()}@kline_{interval}"
+def subscribe_to_stream(symbol, interval, stream_url="wss://stream.binancefuture.com/ws"):
+    ws_url = f"{stream_url}/{symbol.lower()}@kline_{interval}"
     ws = websocket.WebSocketApp(ws_url,
                                 on_message=on_message,
                                 on_error=on_error,
@@ -68,13 +97,32 @@ def signal_handler(sig, frame):
     ws.close()
     sys.exit(0)
 
+# Creates the persister, output writer and pipeline from the settings above; benchmark.py calls it too.
+def setup(data_dir, stream=None):
+    global persister, writer, pipeline
+    # Closed candles are appended to per-day files under data_dir every minute or 1000 rows.
+    # They also go to a memory-mapped HistoryStore under data_dir/SYMBOL/interval that can be queried by time.
+    persister = CandlePersister(data_dir, symbol, flush_interval=60, flush_rows=1000,
+                                history=HistoryStore(data_dir, symbol, interval))
+    writer = OutputWriter(output_mode, max_lines_per_sec, stream=stream)
+    metrics.counter('output_drops', lambda: writer.dropped)
+    pipeline = FramePipeline(on_kline, pipeline_policy, max_size=10_000, batch_size=500, metrics=metrics)
+
 if __name__ == "__main__":
-    # Define the cryptocurrency pair symbol and candle interval.
-    symbol = "BTCUSDT"
-    interval = "1m"
+    # BINANCE_STREAM_URL points the bot at another server, e.g. the local replay server.
+    stream_url = os.environ.get("BINANCE_STREAM_URL", "wss://stream.binancefuture.com/ws")
+    data_dir = os.environ.get("BINANCE_DATA_DIR", r"C:/Users/Reilly Decker/Desktop/websocket_data_v1")
+    setup(data_dir)
+
+    # BINANCE_METRICS_PORT serves per-stage latencies on http://127.0.0.1:PORT/metrics; SIGUSR1 dumps them to stderr.
+    metrics_port = os.environ.get("BINANCE_METRICS_PORT")
+    if metrics_port:
+        metrics.serve(int(metrics_port))
+    metrics.dump_on_signal()
+
     print(f"Subscribing to {symbol} with interval {interval}")
     
-    ws = subscribe_to_stream(symbol, interval)
+    ws = subscribe_to_stream(symbol, interval, stream_url)
     
     # Setup a signal handler for graceful termination with Ctrl+C.
     # This allows for the subscription to be ended manually,
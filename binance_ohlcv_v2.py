@@ -1,11 +1,39 @@
 import websocket
-import json
-import pandas as pd
+import os
 import signal
 import sys
+from candle_schema import candle_columns
+from candle_store import CandleStore
+from history_store import HistoryStore
+from indicators import MovingAverages
+from kline_ingest import KlineIngestor
+from metrics import Metrics
+from output_writer import OutputWriter
+from persistence import CandlePersister
+from pipeline import FramePipeline
 
-# Initializing an empty DataFrame to store incoming data.
-df = pd.DataFrame(columns=['timestamp', 'pair', 'o', 'h', 'l', 'c', 'v'])
+# Initializing an empty columnar store for incoming data.
+# Closed candles are persisted, so only the newest 10,000 rows are kept in memory.
+# Prices and volumes are stored as price_dtype ('float32' halves them), the pair as a categorical.
+price_dtype = 'float64'
+candles = CandleStore(candle_columns(price_dtype=price_dtype), capacity=10_000)
+# Latency of each on_message stage and message/drop counters.
+metrics = Metrics()
+metrics.gauge('candle_store_bytes', candles.nbytes)
+
+# Define the cryptocurrency pair symbol and candle interval.
+symbol = "BTCUSDT"
+interval = "1m"
+# Define periods for moving averages calculation.
+ma_periods = [5, 10]  # Example periods for MAs
+# 'close' computes MAs on closed candles only, 'tick' also previews them on every update.
+signal_mode = 'close'
+# 'every' prints each update, 'closed' only closed candles, 'rate' at most max_lines_per_sec lines.
+output_mode = 'every'
+max_lines_per_sec = None
+# Frames wait in a bounded queue; when it is full 'block' waits, 'drop_oldest' discards
+# the oldest frame and 'coalesce' also skips superseded updates of a forming candle.
+pipeline_policy = 'block'
 
 
 #
@@ -15,7 +43,7 @@ def calculate_moving_averages(df, periods):
         # Calculate the moving average, set min_periods=period to ensure calculation only with enough data,
         # and round to 3 decimal places.
         df[f'MA_{period}'] = (
-            df['c'].astype(float)
+            df['c']
             .rolling(window=period, min_periods=period)
             .mean()
             .round(3)  # Round the result to 3 decimal places
@@ -23,31 +51,30 @@ def calculate_moving_averages(df, periods):
 
 
 def on_message(ws, message):
-    """Handles incoming WebSocket messages by appending them to the DataFrame."""
-    global df
-    message_data = json.loads(message)
+    """Queues the raw frame; decoding and the moving averages run on the pipeline worker."""
+    metrics.count('messages')
+    pipeline.put(message)
+
+def on_kline(kline):
+    """Handles a decoded kline by appending it to the candle store."""
     data = {
-        'timestamp': message_data['k']['t'],
-        'pair': message_data['s'],
-        'o': message_data['k']['o'],
-        'h': message_data['k']['h'],
-        'l': message_data['k']['l'],
-        'c': float(message_data['k']['c']),  # Convert close price to float
-        'v': message_data['k']['v'],
+        'timestamp': kline.open_time,
+        'pair': kline.symbol,
+        'o': kline.open,
+        'h': kline.high,
+        'l': kline.low,
+        'c': kline.close,
+        'v': kline.volume,
     }
-    # Convert data to DataFrame and append
-    new_row = pd.DataFrame([data])
-    df = pd.concat([df, new_row], ignore_index=True)
-
-    # Ensure 'c' is float for moving average calculations
-    df['c'] = df['c'].astype(float)
-
-    # Calculate moving averages after adding the new row.
-    calculate_moving_averages(df, ma_periods)
+    # Store the update under its candle; moving averages are updated when the candle closes.
+    with metrics.time('store'):
+        ingestor.ingest(data, kline.closed)
+    with metrics.time('persist'):
+        persister.collect(candles, ingestor.closed)
     
-    # Print the latest row in the desired format, including MAs
-    if not df.empty:
-        print(df.iloc[-1:].to_string(index=False, header=df.index[-1]==0))
+    # The latest row is printed by a background writer so a slow terminal never stalls the stream.
+    with metrics.time('output'):
+        writer.write(candles.last(), ingestor.closed)
 
 def on_error(ws, error):
     """Handles errors by printing them."""
@@ -55,19 +82,20 @@ def on_error(ws, error):
 
 def on_close(ws, *args, **kwargs):
     """Handles the closing of the WebSocket connection."""
-    global df
     print("Connection closed")
-    csv_file_path = r"C:/Users/Reilly Decker/Desktop/websocket_test.csv"
-    df.to_csv(csv_file_path, index=False)
-    print(f"DataFrame saved to {csv_file_path}")
+    pipeline.close()
+    # Only the rows not flushed yet are written here.
+    persister.close()
+    writer.close()
+    print(f"Candles saved to {persister.root}")
 
 def on_open(ws):
     """Notifies when the WebSocket connection is successfully opened."""
     print("Connection opened")
 
-def subscribe_to_stream(symbol, interval):
+def subscribe_to_stream(symbol, interval, stream_url="wss://stream.binancefuture.com/ws"):
     """Subscribes to a specific Binance kline stream based on symbol and interval."""
-    ws_url = f"wss://stream.binancefuture.com/ws/{symbol.lower()}@kline_{interval}"
+    ws_url = f"{stream_url}/{symbol.lower()}@kline_{interval}"
     ws = websocket.WebSocketApp(ws_url,
                                 on_message=on_message,
                                 on_error=on_error,
@@ -81,15 +109,36 @@ def signal_handler(sig, frame):
     ws.close()
     sys.exit(0)
 
+def setup(data_dir, stream=None):
+    """Creates the ingestor, persister, writer and pipeline from the settings above; benchmark.py calls it too."""
+    global moving_averages, ingestor, persister, writer, pipeline
+    moving_averages = MovingAverages(ma_periods)
+    ingestor = KlineIngestor(candles, moving_averages, ma_column='MA_{period}', signal_mode=signal_mode,
+                             metrics=metrics)
+
+    # Closed candles are appended to per-day files under data_dir every minute or 1000 rows.
+    # They also go to a memory-mapped HistoryStore under data_dir/SYMBOL/interval that can be queried by time.
+    persister = CandlePersister(data_dir, symbol, flush_interval=60, flush_rows=1000,
+                                history=HistoryStore(data_dir, symbol, interval))
+    writer = OutputWriter(output_mode, max_lines_per_sec, stream=stream)
+    metrics.counter('output_drops', lambda: writer.dropped)
+    pipeline = FramePipeline(on_kline, pipeline_policy, max_size=10_000, batch_size=500, metrics=metrics)
+
+
 if __name__ == "__main__":
-    # Define the cryptocurrency pair symbol and candle interval.
-    symbol = "BTCUSDT"
-    interval = "1m"
-    # Define periods for moving averages calculation.
-    ma_periods = [5, 10]  # Example periods for MAs
-    
+    # BINANCE_STREAM_URL points the bot at another server, e.g. the local replay server.
+    stream_url = os.environ.get("BINANCE_STREAM_URL", "wss://stream.binancefuture.com/ws")
+    data_dir = os.environ.get("BINANCE_DATA_DIR", r"C:/Users/Reilly Decker/Desktop/websocket_data")
+    setup(data_dir)
+
+    # BINANCE_METRICS_PORT serves per-stage latencies on http://127.0.0.1:PORT/metrics; SIGUSR1 dumps them to stderr.
+    metrics_port = os.environ.get("BINANCE_METRICS_PORT")
+    if metrics_port:
+        metrics.serve(int(metrics_port))
+    metrics.dump_on_signal()
+
     print(f"Subscribing to {symbol} with interval {interval}")
-    ws = subscribe_to_stream(symbol, interval)
+    ws = subscribe_to_stream(symbol, interval, stream_url)
     
     # Setup a signal handler for graceful termination with Ctrl+C.
     signal.signal(signal.SIGINT, signal_handler)
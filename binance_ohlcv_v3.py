@@ -1,11 +1,46 @@
 import websocket
-import json
-import pandas as pd
+import os
 import signal
 import sys
+from backfill import REST_URL, load_backfill
+from candle_schema import candle_columns
+from candle_store import CandleStore
+from history_store import HistoryStore
+from indicator_graph import IndicatorGraph
+from indicators import MovingAverages
+from kline_ingest import KlineIngestor
+from metrics import Metrics
+from multi_config import ConfigBook, config_grid
+from output_writer import OutputWriter
+from persistence import CandlePersister
+from pipeline import FramePipeline
 
-# Initializing an empty DataFrame to store incoming data.
-df = pd.DataFrame(columns=['timestamp', 'pair', 'o', 'h', 'l', 'c', 'v'])
+# Initializing an empty columnar store for incoming data.
+# Closed candles are persisted, so only the newest 10,000 rows are kept in memory.
+# Prices and volumes are stored as price_dtype ('float32' halves them), the pair as a categorical.
+price_dtype = 'float64'
+candles = CandleStore(candle_columns(price_dtype=price_dtype), capacity=10_000)
+# Latency of each on_message stage and message/drop counters.
+metrics = Metrics()
+metrics.gauge('candle_store_bytes', candles.nbytes)
+
+# All inputs after this statement
+symbol = "BTCUSDT"
+interval = "1m"
+# Define periods for moving averages calculation. The first is considered the short MA, the second the long MA.
+ma_periods = [5, 10]  # Example periods for MAs
+# 'close' computes MAs and signals on closed candles only, 'tick' also on every update.
+signal_mode = 'close'
+# 'every' prints each update, 'closed' only closed candles, 'rate' at most max_lines_per_sec lines.
+output_mode = 'every'
+max_lines_per_sec = None
+# Frames wait in a bounded queue; when it is full 'block' waits, 'drop_oldest' discards
+# the oldest frame and 'coalesce' also skips superseded updates of a forming candle.
+pipeline_policy = 'block'
+# Extra (short, long, trade_percentage) crossovers paper-traded next to the strategy on closed candles,
+# e.g. config_grid([5, 10], [20, 50], [0.1]). They share one IndicatorGraph with the ingestor, so every
+# period is averaged once per candle and the averages are stored as sma_c_<period> columns.
+shadow_configs = []
 
 def calculate_moving_averages(df, periods):
     """Calculates moving averages for specified periods and adds them as new columns."""
@@ -13,7 +48,7 @@ def calculate_moving_averages(df, periods):
         # Calculate the moving average, set min_periods=period to ensure calculation only with enough data,
         # and round to 3 decimal places.
         df[f'MA_{period}'] = (
-            df['c'].astype(float)
+            df['c']
             .rolling(window=period, min_periods=period)
             .mean()
             .round(3)  # Round the result to 3 decimal places
@@ -40,44 +75,58 @@ def calculate_ma_crossover(df, short_period, long_period):
     df['ma_cross'] = df['ma_cross'].astype(int)
 
 def on_message(ws, message):
-    """Handles incoming WebSocket messages by appending them to the DataFrame."""
-    global df
-    message_data = json.loads(message)
-    data = {
-        'timestamp': message_data['k']['t'],
-        'pair': message_data['s'],
-        'o': message_data['k']['o'],
-        'h': message_data['k']['h'],
-        'l': message_data['k']['l'],
-        'c': float(message_data['k']['c']),  # Convert close price to float
-        'v': message_data['k']['v'],
+    """Queues the raw frame; decoding, indicators and the strategy run on the pipeline worker."""
+    metrics.count('messages')
+    pipeline.put(message)
+
+def kline_row(kline):
+    """Builds the candle store row of a decoded kline."""
+    return {
+        'timestamp': kline.open_time,
+        'pair': kline.symbol,
+        'o': kline.open,
+        'h': kline.high,
+        'l': kline.low,
+        'c': kline.close,
+        'v': kline.volume,
     }
-    new_row = pd.DataFrame([data])
-    df = pd.concat([df, new_row], ignore_index=True)
 
-    # Calculate moving averages and crossover after adding the new row.
-    short_ma_period, long_ma_period = ma_periods  # Assuming ma_periods is sorted: [short, long]
-    calculate_ma_crossover(df, short_ma_period, long_ma_period)
+def on_kline(kline):
+    """Handles a decoded kline by appending it to the candle store."""
+    data = kline_row(kline)
+
+    # Store the update under its candle; MAs and the crossover are updated when the candle closes.
+    with metrics.time('store'):
+        ingestor.ingest(data, kline.closed)
+    if shadow_book is not None and kline.closed:
+        with metrics.time('strategy'):
+            # Reads the averages the ingestor just committed to the shared graph.
+            shadow_book.update(kline.close, kline.open_time)
+    with metrics.time('persist'):
+        persister.collect(candles, ingestor.closed)
     
-    # Print the latest row in the desired format, including MAs and ma_cross
-    if not df.empty:
-        print(df.iloc[-1:].to_string(index=False, header=df.index[-1]==0))
+    # The latest row is printed by a background writer so a slow terminal never stalls the stream.
+    with metrics.time('output'):
+        writer.write(candles.last(), ingestor.closed)
 
 def on_error(ws, error):
     print(error)
 
 def on_close(ws, *args, **kwargs):
-    global df
     print("Connection closed")
-    csv_file_path = "C:/Users/Reilly Decker/Desktop/websocket_test.xlsx"
-    df.to_excel(csv_file_path, index=False)
-    print(f"DataFrame saved to {csv_file_path}")
+    pipeline.close()
+    # Only the rows not flushed yet are written here.
+    persister.close()
+    writer.close()
+    print(f"Candles saved to {persister.root}")
+    if shadow_book is not None:
+        print(shadow_book.leaderboard().to_string(index=False))
 
 def on_open(ws):
     print("Connection opened")
 
-def subscribe_to_stream(symbol, interval):
-    ws_url = f"wss://stream.binancefuture.com/ws/{symbol.lower()}@kline_{interval}"
+def subscribe_to_stream(symbol, interval, stream_url="wss://stream.binancefuture.com/ws"):
+    ws_url = f"{stream_url}/{symbol.lower()}@kline_{interval}"
     ws = websocket.WebSocketApp(ws_url,
                                 on_message=on_message,
                                 on_error=on_error,
@@ -91,16 +140,48 @@ def signal_handler(sig, frame):
     sys.exit(0)
 
 
-# All inputs after this statement 
+def setup(data_dir, stream=None):
+    """Creates the ingestor, persister, writer and pipeline from the settings above; benchmark.py calls it too."""
+    global moving_averages, graph, shadow_book, ingestor, persister, writer, pipeline
+    moving_averages = MovingAverages(ma_periods)
+    graph = IndicatorGraph()
+    shadow_book = ConfigBook(shadow_configs, graph=graph) if shadow_configs else None
+    ingestor = KlineIngestor(candles, moving_averages, ma_column='MA_{period}', cross_column='ma_cross',
+                             crossover_periods=ma_periods, signal_mode=signal_mode, metrics=metrics,
+                             graph=graph)
+
+    # Closed candles are appended to per-day files under data_dir every minute or 1000 rows.
+    # They also go to a memory-mapped HistoryStore under data_dir/SYMBOL/interval that can be queried by time.
+    persister = CandlePersister(data_dir, symbol, flush_interval=60, flush_rows=1000,
+                                history=HistoryStore(data_dir, symbol, interval))
+    writer = OutputWriter(output_mode, max_lines_per_sec, stream=stream)
+    metrics.counter('output_drops', lambda: writer.dropped)
+    pipeline = FramePipeline(on_kline, pipeline_policy, max_size=10_000, batch_size=500, metrics=metrics)
+
+
 if __name__ == "__main__":
+    # BINANCE_STREAM_URL points the bot at another server, e.g. the local replay server.
+    stream_url = os.environ.get("BINANCE_STREAM_URL", "wss://stream.binancefuture.com/ws")
+    data_dir = os.environ.get("BINANCE_DATA_DIR", "C:/Users/Reilly Decker/Desktop/websocket_data")
+    setup(data_dir)
+
+    # Seed the candles and MA windows with the last closed candles so signals are available right away.
+    # BINANCE_BACKFILL is the REST klines endpoint or a file saved by backfill.py; empty skips the backfill.
+    backfill_source = os.environ.get("BINANCE_BACKFILL", REST_URL)
+    backfill_candles = 1000
+    history = load_backfill(backfill_source, symbol, interval, backfill_candles)
+    ingestor.warm_up(kline_row(kline) for kline in history)
+    persister.position = candles.appended  # Backfilled candles are not persisted again
+    print(f"Backfilled {len(history)} candles")
+
+    # BINANCE_METRICS_PORT serves per-stage latencies on http://127.0.0.1:PORT/metrics; SIGUSR1 dumps them to stderr.
+    metrics_port = os.environ.get("BINANCE_METRICS_PORT")
+    if metrics_port:
+        metrics.serve(int(metrics_port))
+    metrics.dump_on_signal()
 
-    symbol = "BTCUSDT"
-    interval = "1m"
-    # Define periods for moving averages calculation. The first is considered the short MA, the second the long MA.
-    ma_periods = [5, 10]  # Example periods for MAs
-    
     print(f"Subscribing to {symbol} with interval {interval}")
-    ws = subscribe_to_stream(symbol, interval)
+    ws = subscribe_to_stream(symbol, interval, stream_url)
     
     signal.signal(signal.SIGINT, signal_handler)
     
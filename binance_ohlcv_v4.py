@@ -1,8 +1,20 @@
 import websocket
-import json
-import pandas as pd
+import os
 import signal
 import sys
+from backfill import REST_URL, load_backfill
+from candle_schema import candle_columns
+from candle_store import CandleStore
+from history_store import HistoryStore
+from indicator_graph import IndicatorGraph
+from indicators import MovingAverages
+from kline_ingest import KlineIngestor
+from metrics import Metrics
+from multi_config import ConfigBook, config_grid
+from order_book import DepthFeed
+from output_writer import OutputWriter
+from persistence import CandlePersister
+from pipeline import FramePipeline
 
 # Initializing an empty DataFrame to store incoming data with initial balances.
 initial_usd_balance = 10000  # Starting balance in USD intial Quote Balance
@@ -10,13 +22,37 @@ initial_btc_balance = 1  # Starting balance in BTC intial Base Balance
 buy_trade_percentage = 0.1  # Percentage of portfolio to buy
 sell_trade_percentage = 0.1  # Percentage of portfolio to sell
 leverage = 1  # Leverage used in trades
+# Order book walked for the fill price of each trade, None fills at the close.
+book = None
 
-df = pd.DataFrame(columns=['timestamp', 'pair', 'o', 'h', 'l', 'c', 'v'])
+# Closed candles are persisted, so only the newest 10,000 rows are kept in memory.
+# Prices and volumes are stored as price_dtype ('float32' halves them), the pair as a categorical.
+price_dtype = 'float64'
+candles = CandleStore(candle_columns(price_dtype=price_dtype), capacity=10_000)
+# Latency of each on_message stage and message/drop counters.
+metrics = Metrics()
+metrics.gauge('candle_store_bytes', candles.nbytes)
+
+symbol = "BTCUSDT"
+interval = "1m"
+ma_periods = [5, 10]
+# 'close' computes MAs and signals on closed candles only, 'tick' also on every update.
+signal_mode = 'close'
+# 'every' prints each update, 'closed' only closed candles, 'rate' at most max_lines_per_sec lines.
+output_mode = 'every'
+max_lines_per_sec = None
+# Frames wait in a bounded queue; when it is full 'block' waits, 'drop_oldest' discards
+# the oldest frame and 'coalesce' also skips superseded updates of a forming candle.
+pipeline_policy = 'block'
+# Extra (short, long, trade_percentage) crossovers paper-traded next to the strategy on closed candles,
+# e.g. config_grid([5, 10], [20, 50], [0.1]). They share one IndicatorGraph with the ingestor, so every
+# period is averaged once per candle and the averages are stored as sma_c_<period> columns.
+shadow_configs = []
 
 def calculate_moving_averages(df, periods):
     for period in periods:
         df[f'ma{period}'] = (
-            df['c'].astype(float)
+            df['c']
             .rolling(window=period, min_periods=period)
             .mean()
             .round(3)
@@ -37,58 +73,91 @@ def calculate_crossover(df, short_period, long_period):
     
     df['cross'] = df['cross'].astype(int)
 
+def fill_price(side, price, quantity=None, quote=None):
+    if book is None:
+        return price
+    fill = book.average_price(side, quantity, quote, reference=price)
+    return price if fill is None else fill
+
 def calculate_portfolio_balance(row):
     global initial_usd_balance, initial_btc_balance
     if row['cross'] == 1:
         buy_amount_usd = initial_usd_balance * buy_trade_percentage
-        btc_bought = (buy_amount_usd / row['c']) * leverage
+        btc_bought = (buy_amount_usd / fill_price(1, row['c'], quote=buy_amount_usd * leverage)) * leverage
         initial_usd_balance -= buy_amount_usd
         initial_btc_balance += btc_bought
     elif row['cross'] == -1:
         btc_sold = initial_btc_balance * sell_trade_percentage
-        usd_earned = (btc_sold * row['c']) * leverage
+        usd_earned = (btc_sold * fill_price(-1, row['c'], quantity=btc_sold * leverage)) * leverage
         initial_usd_balance += usd_earned
         initial_btc_balance -= btc_sold
     return initial_usd_balance, initial_btc_balance, initial_usd_balance + (initial_btc_balance * row['c'])
 
 def on_message(ws, message):
-    global df
-    message_data = json.loads(message)
-    data = {
-        'timestamp': message_data['k']['t'],
-        'pair': message_data['s'],
-        #'o': message_data['k']['o'],
-        #'h': message_data['k']['h'],
-        #'l': message_data['k']['l'],
-        'c': float(message_data['k']['c']),
-        'v': message_data['k']['v'],
+    # The receive thread only queues the frame; decoding and the strategy run on the pipeline worker.
+    metrics.count('messages')
+    pipeline.put(message)
+
+def kline_row(kline):
+    # The candle store row of a decoded kline.
+    return {
+        'timestamp': kline.open_time,
+        'pair': kline.symbol,
+        #'o': kline.open,
+        #'h': kline.high,
+        #'l': kline.low,
+        'c': kline.close,
+        'v': kline.volume,
     }
-    new_row = pd.DataFrame([data])
-    df = pd.concat([df, new_row], ignore_index=True)
 
-    calculate_crossover(df, ma_periods[0], ma_periods[1])
+def on_kline(kline):
+    data = kline_row(kline)
+    # Store the update under its candle; MAs and the crossover are updated when the candle closes.
+    with metrics.time('store'):
+        fired = ingestor.ingest(data, kline.closed)
+    if shadow_book is not None and kline.closed:
+        with metrics.time('strategy'):
+            # Reads the averages the ingestor just committed to the shared graph.
+            shadow_book.update(kline.close, kline.open_time)
 
-    df[['usd_balance', 'btc_balance', 'total_portfolio_value']] = df.apply(calculate_portfolio_balance, axis=1, result_type='expand')
+    with metrics.time('strategy'):
+        if fired and kline.closed:
+            # Only the signal of the candle that just closed is traded; earlier rows keep their balances.
+            usd_balance, btc_balance, total_portfolio_value = calculate_portfolio_balance(candles.last())
+        else:
+            # No trade on a forming candle; it shows the balances as they stand.
+            usd_balance, btc_balance = initial_usd_balance, initial_btc_balance
+            total_portfolio_value = initial_usd_balance + (initial_btc_balance * data['c'])
+        candles.update_last({
+            'usd_balance': float(usd_balance),
+            'btc_balance': float(btc_balance),
+            'total_portfolio_value': float(total_portfolio_value),
+        })
+    with metrics.time('persist'):
+        persister.collect(candles, ingestor.closed)
     
-    # Print the latest row in the desired format, including MAs and ma_cross
-    if not df.empty:
-        print(df.iloc[-1:].to_string(index=False, header=df.index[-1]==0))
+    # The latest row is printed by a background writer so a slow terminal never stalls the stream.
+    with metrics.time('output'):
+        writer.write(candles.last(), ingestor.closed)
 
 def on_error(ws, error):
     print(error)
 
 def on_close(ws, *args, **kwargs):
-    global df
     print("Connection closed")
-    csv_file_path = "C:/Users/Reilly Decker/Desktop/websocket_test.csv"
-    df.to_csv(csv_file_path, index=False)
-    print(f"DataFrame saved to {csv_file_path}")
+    pipeline.close()
+    # Only the rows not flushed yet are written here.
+    persister.close()
+    writer.close()
+    print(f"Candles saved to {persister.root}")
+    if shadow_book is not None:
+        print(shadow_book.leaderboard().to_string(index=False))
 
 def on_open(ws):
     print("Connection opened")
 
-def subscribe_to_stream(symbol, interval):
-    ws_url = f"wss://stream.binancefuture.com/ws/{symbol.lower()}@kline_{interval}"
+def subscribe_to_stream(symbol, interval, stream_url="wss://stream.binancefuture.com/ws"):
+    ws_url = f"{stream_url}/{symbol.lower()}@kline_{interval}"
     ws = websocket.WebSocketApp(ws_url, on_message=on_message, on_error=on_error, on_close=on_close)
     ws.on_open = on_open
     return ws
@@ -98,12 +167,50 @@ def signal_handler(sig, frame):
     ws.close()
     sys.exit(0)
 
+def setup(data_dir, stream=None):
+    # Creates the ingestor, persister, writer and pipeline from the settings above; benchmark.py calls it too.
+    global moving_averages, graph, shadow_book, ingestor, persister, writer, pipeline
+    moving_averages = MovingAverages(ma_periods)
+    graph = IndicatorGraph()
+    shadow_book = ConfigBook(shadow_configs, graph=graph) if shadow_configs else None
+    ingestor = KlineIngestor(candles, moving_averages, cross_column='cross', crossover_periods=ma_periods,
+                             signal_mode=signal_mode, metrics=metrics, graph=graph)
+
+    # Closed candles are appended to per-day files under data_dir every minute or 1000 rows.
+    # They also go to a memory-mapped HistoryStore under data_dir/SYMBOL/interval that can be queried by time.
+    persister = CandlePersister(data_dir, symbol, flush_interval=60, flush_rows=1000,
+                                history=HistoryStore(data_dir, symbol, interval))
+    writer = OutputWriter(output_mode, max_lines_per_sec, stream=stream)
+    metrics.counter('output_drops', lambda: writer.dropped)
+    pipeline = FramePipeline(on_kline, pipeline_policy, max_size=10_000, batch_size=500, metrics=metrics)
+
 if __name__ == "__main__":
-    symbol = "BTCUSDT"
-    interval = "1m"
-    ma_periods = [5, 10]
+    # BINANCE_STREAM_URL points the bot at another server, e.g. the local replay server.
+    stream_url = os.environ.get("BINANCE_STREAM_URL", "wss://stream.binancefuture.com/ws")
+    data_dir = os.environ.get("BINANCE_DATA_DIR", "C:/Users/Reilly Decker/Desktop/websocket_data")
+    setup(data_dir)
+
+    # Seed the candles and MA windows with the last closed candles so signals are available right away.
+    # BINANCE_BACKFILL is the REST klines endpoint or a file saved by backfill.py; empty skips the backfill.
+    backfill_source = os.environ.get("BINANCE_BACKFILL", REST_URL)
+    backfill_candles = 1000
+    history = load_backfill(backfill_source, symbol, interval, backfill_candles)
+    ingestor.warm_up(kline_row(kline) for kline in history)
+    persister.position = candles.appended  # Backfilled candles are not persisted again or traded on
+    print(f"Backfilled {len(history)} candles")
+
+    # BINANCE_METRICS_PORT serves per-stage latencies on http://127.0.0.1:PORT/metrics; SIGUSR1 dumps them to stderr.
+    metrics_port = os.environ.get("BINANCE_METRICS_PORT")
+    if metrics_port:
+        metrics.serve(int(metrics_port))
+    metrics.dump_on_signal()
+
+    # Keep a local order book from the @depth@100ms stream and walk it for the fill prices.
+    fill_from_order_book = False
+    if fill_from_order_book:
+        book = DepthFeed([symbol]).start().books[symbol]
 
     print(f"Subscribing to {symbol} with interval {interval}")
-    ws = subscribe_to_stream(symbol, interval)
+    ws = subscribe_to_stream(symbol, interval, stream_url)
     signal.signal(signal.SIGINT, signal_handler)
     ws.run_forever()
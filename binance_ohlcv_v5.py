@@ -1,8 +1,23 @@
 import websocket
-import json
-import pandas as pd
+import os
 import signal
 import sys
+from backfill import REST_URL, load_backfill
+from candle_schema import candle_columns
+from candle_store import CandleStore
+from checkpoint import Checkpointer
+from history_store import HistoryStore
+from indicator_graph import IndicatorGraph
+from indicators import MovingAverages
+from kline_ingest import KlineIngestor
+from ledger import PortfolioLedger
+from metrics import Metrics
+from multi_config import ConfigBook, config_grid
+from order_book import DepthFeed
+from output_writer import OutputWriter
+from persistence import CandlePersister
+from pipeline import FramePipeline, decode_klines
+from trade_bars import TradeBarBuilder
 
 # Initializing global variables for balances and trade parameters.
 initial_usd_balance = 10000  # Starting balance in USD
@@ -10,15 +25,45 @@ initial_btc_balance = 1  # Starting balance in BTC
 buy_trade_percentage = 0.1  # Percentage of portfolio to buy
 sell_trade_percentage = 0.1  # Percentage of portfolio to sell
 leverage = 1  # Leverage used in trades
-last_trade_signal = 0  # Tracks the last signal that triggered a trade
 
-# Initializing an empty DataFrame to store incoming data with initial balances.
-df = pd.DataFrame(columns=['timestamp', 'pair', 'c', 'v'])
+# The ledger applies each new signal once and keeps the running balances.
+ledger = PortfolioLedger(initial_usd_balance, initial_btc_balance, buy_trade_percentage, sell_trade_percentage, leverage)
+
+# Initializing an empty columnar store for incoming data and balances.
+# Closed candles are persisted, so only the newest 10,000 rows are kept in memory.
+# Prices and volumes are stored as price_dtype ('float32' halves them), the pair as a categorical.
+price_dtype = 'float64'
+candles = CandleStore(candle_columns(('c', 'v'), price_dtype), capacity=10_000)
+# Latency of each on_message stage and message/drop counters.
+metrics = Metrics()
+metrics.gauge('candle_store_bytes', candles.nbytes)
+
+symbol = "BTCUSDT"
+interval = "1m"
+# Set to e.g. '1s' to build the candles locally from the @aggTrade stream instead of @kline_<interval>.
+trade_bar_interval = None
+if trade_bar_interval:
+    interval = trade_bar_interval
+ma_periods = [5, 10]  # Specify moving average periods
+# 'close' computes MAs and signals on closed candles only, 'tick' also on every update.
+signal_mode = 'close'
+# Most candles the bot fetches to catch up after a restart or reconnect.
+max_gap_candles = 10_000
+# 'every' prints each update, 'closed' only closed candles, 'rate' at most max_lines_per_sec lines.
+output_mode = 'every'
+max_lines_per_sec = None
+# Frames wait in a bounded queue; when it is full 'block' waits, 'drop_oldest' discards
+# the oldest frame and 'coalesce' also skips superseded updates of a forming candle.
+pipeline_policy = 'block'
+# Extra (short, long, trade_percentage) crossovers paper-traded next to the strategy on closed candles,
+# e.g. config_grid([5, 10], [20, 50], [0.1]). They share one IndicatorGraph with the ingestor, so every
+# period is averaged once per candle and the averages are stored as sma_c_<period> columns.
+shadow_configs = []
 
 def calculate_moving_averages(df, periods):
     for period in periods:
         df[f'ma{period}'] = (
-            df['c'].astype(float)
+            df['c']
             .rolling(window=period, min_periods=period)
             .mean()
             .round(3)
@@ -40,60 +85,80 @@ def calculate_crossover(df, short_period, long_period):
     df['cross'] = df['cross'].astype(int)
 
 def calculate_portfolio_balance(row):
-    global initial_usd_balance, initial_btc_balance, last_trade_signal
-    current_signal = row['cross']
-
-    if current_signal in [1, -1] and current_signal != last_trade_signal:
-        if current_signal == 1:  # Buy signal
-            buy_amount_usd = initial_usd_balance * buy_trade_percentage
-            btc_bought = (buy_amount_usd / row['c']) * leverage
-            initial_usd_balance -= buy_amount_usd
-            initial_btc_balance += btc_bought
-        elif current_signal == -1:  # Sell signal
-            btc_sold = initial_btc_balance * sell_trade_percentage
-            usd_earned = (btc_sold * row['c']) * leverage
-            initial_usd_balance += usd_earned
-            initial_btc_balance -= btc_sold
-        last_trade_signal = current_signal  # Update the last trade signal
-
-    return initial_usd_balance, initial_btc_balance, initial_usd_balance + (initial_btc_balance * row['c'])
+    return ledger.apply(row['cross'], row['c'])
+
+def add_portfolio_balance(row):
+    # Only the newest signal is applied; earlier rows keep the balances they were stored with.
+    row['usd_balance'], row['btc_balance'], row['total_portfolio_value'] = calculate_portfolio_balance(row)
 
 def on_message(ws, message):
-    global df, last_trade_signal
-    message_data = json.loads(message)
-    data = {
-        'timestamp': message_data['k']['t'],
-        'pair': message_data['s'],
-        'c': float(message_data['k']['c']),
-        'v': message_data['k']['v'],
+    # The receive thread only queues the frame; decoding and the strategy run on the pipeline worker.
+    metrics.count('messages')
+    pipeline.put(message)
+
+def kline_row(kline):
+    # The candle store row of a decoded kline.
+    return {
+        'timestamp': kline.open_time,
+        'pair': kline.symbol,
+        'c': kline.close,
+        'v': kline.volume,
     }
-    new_row = pd.DataFrame([data])
-    df = pd.concat([df, new_row], ignore_index=True)
-
-    calculate_crossover(df, ma_periods[0], ma_periods[1])
 
-    df[['usd_balance', 'btc_balance', 'total_portfolio_value']] = df.apply(calculate_portfolio_balance, axis=1, result_type='expand')
+def on_kline(kline):
+    data = kline_row(kline)
+    # Store the update under its candle; signals and balances are updated when the candle closes.
+    with metrics.time('store'):
+        ingestor.ingest(data, kline.closed)
+    if shadow_book is not None and kline.closed:
+        with metrics.time('strategy'):
+            # Reads the averages the ingestor just committed to the shared graph.
+            shadow_book.update(kline.close, kline.open_time)
+    if kline.closed:
+        checkpointer.save(kline.open_time)
+    with metrics.time('persist'):
+        persister.collect(candles, ingestor.closed)
     
-    if not df.empty:
-        print(df.iloc[-1:].to_string(index=False, header=df.index[-1]==0))
+    # The latest row is printed by a background writer so a slow terminal never stalls the stream.
+    with metrics.time('output'):
+        writer.write(candles.last(), ingestor.closed)
 
 def on_error(ws, error):
     print(error)
 
 def on_close(ws, *args, **kwargs):
-    global df
     print("Connection closed")
-    csv_file_path = "C:/Users/Reilly Decker/Desktop/websocket_test.csv"
-    df.to_csv(csv_file_path, index=False)
-    print(f"DataFrame saved to {csv_file_path}")
+    pipeline.close()
+    if checkpointer.last_timestamp is not None:
+        checkpointer.save(checkpointer.last_timestamp, force=True)
+    # Only the rows not flushed yet are written here.
+    persister.close()
+    writer.close()
+    print(f"Candles saved to {persister.root}")
+    if shadow_book is not None:
+        print(shadow_book.leaderboard().to_string(index=False))
+
+def fill_gap(since):
+    # Runs the candles closed after the one opened at since through the strategy, e.g. those missed while offline.
+    missed = load_backfill(backfill_source, symbol, interval, max_gap_candles, since=since)
+    for kline in missed:
+        on_kline(kline)
+    if missed:
+        checkpointer.save(missed[-1].open_time, force=True)
+    return len(missed)
 
 def on_open(ws):
-    global last_trade_signal
-    last_trade_signal = 0  # Reset last_trade_signal when the websocket connection opens
+    # The ledger keeps its state across reconnects; only the candles missed meanwhile are filled in.
+    if checkpointer.last_timestamp is not None:
+        pipeline.join()  # No frames arrive before on_open returns, so the worker stays idle while filling
+        filled = fill_gap(checkpointer.last_timestamp)
+        if filled:
+            print(f"Filled {filled} candles missed while disconnected")
     print("Connection opened")
 
-def subscribe_to_stream(symbol, interval):
-    ws_url = f"wss://stream.binancefuture.com/ws/{symbol.lower()}@kline_{interval}"
+def subscribe_to_stream(symbol, interval, stream_url="wss://stream.binancefuture.com/ws", trades=False):
+    stream = "aggTrade" if trades else f"kline_{interval}"
+    ws_url = f"{stream_url}/{symbol.lower()}@{stream}"
     ws = websocket.WebSocketApp(ws_url, on_message=on_message, on_error=on_error, on_close=on_close)
     ws.on_open = on_open
     return ws
@@ -103,12 +168,71 @@ def signal_handler(sig, frame):
     ws.close()
     sys.exit(0)
 
+def setup(data_dir, stream=None):
+    # Creates the ingestor, persister, checkpointer, writer and pipeline from the settings above;
+    # benchmark.py calls it too.
+    global moving_averages, graph, shadow_book, ingestor, persister, checkpointer, writer, pipeline
+    moving_averages = MovingAverages(ma_periods)
+    graph = IndicatorGraph()
+    shadow_book = ConfigBook(shadow_configs, graph=graph) if shadow_configs else None
+    ingestor = KlineIngestor(candles, moving_averages, cross_column='cross', crossover_periods=ma_periods,
+                             signal_mode=signal_mode, strategy=add_portfolio_balance, metrics=metrics,
+                             graph=graph)
+
+    # Closed candles are appended to per-day files under data_dir every minute or 1000 rows.
+    # They also go to a memory-mapped HistoryStore under data_dir/SYMBOL/interval that can be queried by time.
+    persister = CandlePersister(data_dir, symbol, flush_interval=60, flush_rows=1000,
+                                history=HistoryStore(data_dir, symbol, interval))
+
+    # Balances, last_trade_signal and the MA windows are checkpointed after closed candles, at most once a minute.
+    checkpointer = Checkpointer(os.path.join(data_dir, f"{symbol}_v5_checkpoint.npy"), moving_averages, ledger,
+                                interval=60)
+
+    writer = OutputWriter(output_mode, max_lines_per_sec, stream=stream)
+    metrics.counter('output_drops', lambda: writer.dropped)
+    decode = TradeBarBuilder([interval]).decode if trade_bar_interval else decode_klines
+    pipeline = FramePipeline(on_kline, pipeline_policy, max_size=10_000, batch_size=500, metrics=metrics,
+                             decode=decode)
+    metrics.counter('trades', lambda: ledger.trades)
+
 if __name__ == "__main__":
-    symbol = "BTCUSDT"
-    interval = "1m"
-    ma_periods = [5, 10]  # Specify moving average periods
+    # BINANCE_STREAM_URL points the bot at another server, e.g. the local replay server.
+    stream_url = os.environ.get("BINANCE_STREAM_URL", "wss://stream.binancefuture.com/ws")
+    data_dir = os.environ.get("BINANCE_DATA_DIR", "C:/Users/Reilly Decker/Desktop/websocket_data")
+    setup(data_dir)
+
+    # BINANCE_BACKFILL is the REST klines endpoint or a file saved by backfill.py; empty skips the backfill.
+    backfill_source = os.environ.get("BINANCE_BACKFILL", REST_URL)
+    backfill_candles = 1000
+
+    # BINANCE_METRICS_PORT serves per-stage latencies on http://127.0.0.1:PORT/metrics; SIGUSR1 dumps them to stderr.
+    metrics_port = os.environ.get("BINANCE_METRICS_PORT")
+    if metrics_port:
+        metrics.serve(int(metrics_port))
+    metrics.dump_on_signal()
+
+    # Fill simulated trades at the average price of walking a local order book kept from the
+    # @depth@100ms stream instead of at the candle close.
+    fill_from_order_book = False
+    if fill_from_order_book:
+        ledger.book = DepthFeed([symbol]).start().books[symbol]
+        metrics.counter('depth_updates', lambda: ledger.book.updates)
+
+    resumed_from = checkpointer.restore()
+    if resumed_from is None:
+        # Seed the candles and MA windows with the last closed candles so signals are available right away.
+        history = load_backfill(backfill_source, symbol, interval, backfill_candles)
+        ingestor.warm_up(kline_row(kline) for kline in history)
+        persister.position = candles.appended  # Backfilled candles are not persisted again
+        if history:
+            checkpointer.last_timestamp = history[-1].open_time  # on_open fills candles closed since
+        print(f"Backfilled {len(history)} candles")
+    else:
+        # Resume the ledger and MA windows, then trade the candles closed while the bot was down.
+        print(f"Resumed from checkpoint at {resumed_from}, filled {fill_gap(resumed_from)} missed candles")
 
     print(f"Subscribing to {symbol} with interval {interval}")
-    ws = subscribe_to_stream(symbol, interval)
+    ws = subscribe_to_stream(symbol, interval, stream_url, trades=bool(trade_bar_interval))
     signal.signal(signal.SIGINT, signal_handler)
-    ws.run_forever()
+    # Reconnect 5 seconds after the connection drops; on_open then fills the gap.
+    ws.run_forever(reconnect=5)
@@ -0,0 +1,102 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# Dtypes the price and volume columns may be stored in; float32 halves them at ~7 significant digits.
+PRICE_DTYPES = ('float64', 'float32')
+OHLCV_COLUMNS = ('o', 'h', 'l', 'c', 'v')
+# Marker dtype of the symbol column: CandleStore keeps it as integer codes into one list of symbols.
+SYMBOL_DTYPE = 'category'
+
+
+def _check_price_dtype(price_dtype):
+    if np.dtype(price_dtype).name not in PRICE_DTYPES:
+        raise ValueError(f"Unknown price_dtype {price_dtype!r}, expected one of {PRICE_DTYPES}")
+    return np.dtype(price_dtype).name
+
+
+def candle_columns(columns=OHLCV_COLUMNS, price_dtype='float64'):
+    """The candle schema as {column: dtype} for a CandleStore.
+
+    'timestamp' is the candle open time in epoch milliseconds (int64), 'pair' the
+    symbol as a categorical, and every price or volume column in columns is stored as
+    price_dtype.
+    """
+    price_dtype = _check_price_dtype(price_dtype)
+    return {'timestamp': 'int64', 'pair': SYMBOL_DTYPE, **{column: price_dtype for column in columns}}
+
+
+def csv_dtypes(columns=OHLCV_COLUMNS, price_dtype='float64'):
+    """The price and volume columns of the schema as read_csv dtypes."""
+    price_dtype = _check_price_dtype(price_dtype)
+    return {column: price_dtype for column in columns}
+
+
+def to_epoch_ms(datetimes):
+    """Epoch milliseconds of datetimes or date strings, naive ones taken as UTC.
+
+    An array or Series gives an int64 array, a single value such as '2024-03-01' an int
+    and None gives None.
+    """
+    if datetimes is None:
+        return None
+    if np.ndim(datetimes) == 0:
+        return int(to_epoch_ms([datetimes])[0])
+    index = pd.DatetimeIndex(datetimes)
+    if index.tz is not None:
+        index = index.tz_convert(None)
+    return index.as_unit('ms').asi8.copy()
+
+
+def apply_schema(frame, price_dtype='float64'):
+    """Converts a candle DataFrame to the schema in place: adds the int64 'timestamp' from 'datetime'
+    when missing, stores the price and volume columns as price_dtype and 'pair' as a categorical."""
+    price_dtype = _check_price_dtype(price_dtype)
+    if 'timestamp' not in frame and 'datetime' in frame:
+        frame.insert(0, 'timestamp', to_epoch_ms(frame['datetime']))
+    for column in OHLCV_COLUMNS:
+        if column in frame and frame[column].dtype != price_dtype:
+            frame[column] = frame[column].astype(price_dtype)
+    if 'pair' in frame and not isinstance(frame['pair'].dtype, pd.CategoricalDtype):
+        frame['pair'] = frame['pair'].astype('category')
+    return frame
+
+
+def memory_report(data):
+    """Bytes held per column of a CandleStore or DataFrame, with a total row.
+
+    Object columns are measured deeply, i.e. including the Python objects they point to.
+    """
+    frame = data if isinstance(data, pd.DataFrame) else data.to_frame()
+    usage = frame.memory_usage(index=False, deep=True)
+    rows = max(len(frame), 1)
+    report = pd.DataFrame({
+        'dtype': [str(frame[column].dtype) for column in frame],
+        'bytes': usage.to_numpy(),
+        'bytes_per_row': usage.to_numpy() / rows,
+    }, index=list(frame.columns))
+    report.loc['total'] = ['', int(usage.sum()), usage.sum() / rows]
+    return report
+
+
+if __name__ == "__main__":
+    # Compares the footprint of kline rows kept as the raw JSON strings with the typed schema.
+    from candle_store import CandleStore
+    from kline_decoder import _decode_with_dicts, decode_kline, synthetic_frames
+
+    parser = argparse.ArgumentParser(description="Memory footprint of the candle schema.")
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    frames = synthetic_frames(args.rows)
+    raw = pd.DataFrame([_decode_with_dicts(frame) for frame in frames])
+    print(f"Raw JSON fields, object columns ({len(raw)} rows):")
+    print(memory_report(raw).to_string())
+    for price_dtype in PRICE_DTYPES:
+        candles = CandleStore(candle_columns(price_dtype=price_dtype))
+        for kline in map(decode_kline, frames):
+            candles.append({'timestamp': kline.open_time, 'pair': kline.symbol, 'o': kline.open, 'h': kline.high,
+                            'l': kline.low, 'c': kline.close, 'v': kline.volume})
+        print(f"\nCandle schema, {price_dtype}:")
+        print(memory_report(candles).to_string())
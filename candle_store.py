@@ -0,0 +1,159 @@
+import numpy as np
+import pandas as pd
+
+
+class CandleStore:
+    """Append-only columnar candle store backed by typed NumPy arrays.
+
+    Appends write one value per column into preallocated arrays that double in size
+    when full, so ingest cost stays flat however long the bot runs. With a capacity
+    the store behaves as a ring and keeps only the newest ``capacity`` rows.
+    Columns that are not declared up front are added on first use. A column declared
+    as 'category' (e.g. the symbol) is kept as int32 codes into a list of its distinct
+    values and read back as a pandas Categorical.
+    """
+
+    def __init__(self, columns, capacity=None, initial_size=1024):
+        self.capacity = capacity
+        # A ring keeps twice its capacity so the live rows are always one contiguous slice.
+        self._size = 2 * capacity if capacity else initial_size
+        self._categories = {name: {} for name, dtype in columns.items() if dtype == 'category'}  # value -> code
+        self._labels = {name: [] for name in self._categories}  # code -> value
+        self._arrays = {name: np.empty(self._size, dtype='int32' if name in self._categories else dtype)
+                        for name, dtype in columns.items()}
+        self._start = 0
+        self._end = 0
+        self.appended = 0  # Rows appended over the store's lifetime, including evicted ones
+
+    def __len__(self):
+        return self._end - self._start
+
+    def __contains__(self, name):
+        return name in self._arrays
+
+    @property
+    def columns(self):
+        return list(self._arrays)
+
+    def _encode(self, name, value):
+        """Stores value as-is, or as its code in a category column; -1 marks a missing category."""
+        codes = self._categories.get(name)
+        if codes is None:
+            return value
+        if value is None or value != value:
+            return -1
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(codes)
+            self._labels[name].append(value)
+        return code
+
+    def _decode(self, name, values):
+        """Turns the codes of a category column into a Categorical (a single code into its value)."""
+        labels = self._labels.get(name)
+        if labels is None:
+            return values
+        if np.ndim(values) == 0:
+            return labels[values] if values >= 0 else None
+        return pd.Categorical.from_codes(values, categories=labels)
+
+    def _add_column(self, name, dtype):
+        """Adds a column, filling the existing rows with the dtype's missing value."""
+        array = np.empty(self._size, dtype=dtype)
+        array[self._start:self._end] = _missing_value(array.dtype)
+        self._arrays[name] = array
+
+    def _make_room(self):
+        """Grows the arrays, or in ring mode moves the live rows back to the front."""
+        length = len(self)
+        if self.capacity:
+            for array in self._arrays.values():
+                array[:length] = array[self._start:self._end]
+        else:
+            self._size *= 2
+            for name, array in self._arrays.items():
+                grown = np.empty(self._size, dtype=array.dtype)
+                grown[:length] = array[self._start:self._end]
+                self._arrays[name] = grown
+        self._start, self._end = 0, length
+
+    def append(self, row):
+        """Appends one row given as {column: value}; missing columns are left empty."""
+        for name, value in row.items():
+            if name not in self._arrays:
+                self._add_column(name, _column_dtype(value))
+        if self._end == self._size:
+            self._make_room()
+        for name, array in self._arrays.items():
+            if name in row:
+                array[self._end] = self._encode(name, row[name])
+            else:
+                array[self._end] = -1 if name in self._categories else _missing_value(array.dtype)
+        self._end += 1
+        self.appended += 1
+        if self.capacity and len(self) > self.capacity:
+            self._start += 1
+
+    def update_last(self, row):
+        """Overwrites the given columns of the newest row in place."""
+        for name, value in row.items():
+            if name not in self._arrays:
+                self._add_column(name, _column_dtype(value))
+            self._arrays[name][self._end - 1] = self._encode(name, value)
+
+    def column(self, name):
+        """Returns a zero-copy view of a column over the stored rows; a category column as a Categorical."""
+        return self._decode(name, self._arrays[name][self._start:self._end])
+
+    def __getitem__(self, name):
+        return self.column(name)
+
+    def set_column(self, name, values):
+        """Overwrites a whole column in place, adding it if it does not exist yet."""
+        values = np.asarray(values)
+        if name not in self._arrays:
+            self._add_column(name, _column_dtype(values))
+        if name in self._categories:
+            values = [self._encode(name, value) for value in values]
+        self._arrays[name][self._start:self._end] = values
+
+    def rows_since(self, position, stop=None):
+        """Copies the rows with lifetime positions [position, stop) that are still held, as {column: array}."""
+        first = self.appended - len(self)
+        stop = self.appended if stop is None else stop
+        start = self._start + max(position, first) - first
+        end = self._start + max(stop, first) - first
+        return {name: self._decode(name, array[start:end].copy()) for name, array in self._arrays.items()}
+
+    def last(self):
+        """Returns the newest row as a dict."""
+        return {name: self._decode(name, array[self._end - 1]) for name, array in self._arrays.items()}
+
+    def to_frame(self, copy=False):
+        """Returns the stored rows as a DataFrame; without copy the columns are views on the store."""
+        return pd.DataFrame({name: self.column(name) for name in self._arrays}, copy=copy)
+
+    def nbytes(self):
+        """Bytes allocated by the column arrays, including the unused capacity."""
+        return sum(array.nbytes for array in self._arrays.values())
+
+    def tail(self, n=1):
+        """Returns the newest n rows as a small DataFrame, e.g. for printing."""
+        start = max(self._start, self._end - n)
+        return pd.DataFrame({name: self._decode(name, array[start:self._end]) for name, array in self._arrays.items()},
+                            index=range(self._end - start))
+
+
+def _column_dtype(value):
+    """Picks the dtype for a column first seen with value; strings are kept as objects."""
+    dtype = np.asarray(value).dtype
+    return object if dtype.kind in 'US' else dtype
+
+
+def _missing_value(dtype):
+    """Value used for rows that have no entry in a column."""
+    if dtype.kind == 'f':
+        return np.nan
+    if dtype.kind in 'iub':
+        return 0
+    return np.nan
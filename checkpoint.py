@@ -0,0 +1,116 @@
+import os
+import time
+
+import numpy as np
+
+# Bump when the layout below changes; older checkpoints are then ignored.
+CHECKPOINT_VERSION = 1
+_HEADER = 10  # version, last timestamp, ledger fields (6), number of periods, reserved
+_WINDOW_FIELDS = 10  # period, the 7 RollingMean state fields, value, window length
+
+
+def _encode(last_timestamp, moving_averages, ledger):
+    """Flattens the state into one float64 vector: header, then one block per moving average.
+
+    Every value is a float64 so the file is a single .npy array; timestamps and counts
+    stay exact because they are far below 2**53.
+    """
+    averages = list(moving_averages.averages.values()) if moving_averages is not None else []
+    size = _HEADER + sum(_WINDOW_FIELDS + average.period for average in averages)
+    state = np.full(size, np.nan)
+    state[0] = CHECKPOINT_VERSION
+    state[1] = last_timestamp
+    if ledger is not None:
+        state[2:8] = (ledger.usd_balance, ledger.btc_balance, ledger.last_trade_signal, ledger.trades,
+                      ledger.price, 1.0)
+    state[8] = len(averages)
+    offset = _HEADER
+    for average in averages:
+        window = list(average.window)
+        state[offset] = average.period
+        state[offset + 1:offset + 8] = average._state
+        state[offset + 8] = average.value
+        state[offset + 9] = len(window)
+        state[offset + _WINDOW_FIELDS:offset + _WINDOW_FIELDS + len(window)] = window
+        offset += _WINDOW_FIELDS + average.period
+    return state
+
+
+def save_checkpoint(path, last_timestamp, moving_averages=None, ledger=None):
+    """Atomically replaces path with the ledger and moving-average window state.
+
+    The file is a plain .npy float64 vector, so it can be read back with
+    np.load(path, mmap_mode='r'). It is written next to path and moved over it, so a
+    crash never leaves a half-written checkpoint behind.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as output:
+        np.save(output, _encode(last_timestamp, moving_averages, ledger))
+        output.flush()
+        os.fsync(output.fileno())
+    os.replace(temp_path, path)
+
+
+def restore_checkpoint(path, moving_averages=None, ledger=None):
+    """Restores the state saved by save_checkpoint; returns the last candle's open time, or None.
+
+    Nothing is changed when there is no usable checkpoint, or when its periods do not
+    match moving_averages (the configuration changed since it was written).
+    """
+    try:
+        state = np.load(path, mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+    if len(state) < _HEADER or state[0] != CHECKPOINT_VERSION:
+        return None
+
+    blocks = {}
+    offset = _HEADER
+    for _ in range(int(state[8])):
+        period = int(state[offset])
+        blocks[period] = offset
+        offset += _WINDOW_FIELDS + period
+    averages = moving_averages.averages if moving_averages is not None else {}
+    if set(blocks) != set(averages):
+        return None
+
+    for period, average in averages.items():
+        offset = blocks[period]
+        nobs, sum_x, comp_add, comp_remove, neg_ct, same_ct, prev_value = state[offset + 1:offset + 8].tolist()
+        average._state = (int(nobs), sum_x, comp_add, comp_remove, int(neg_ct), int(same_ct), prev_value)
+        average.value = float(state[offset + 8])
+        length = int(state[offset + 9])
+        average.window.clear()
+        average.window.extend(state[offset + _WINDOW_FIELDS:offset + _WINDOW_FIELDS + length].tolist())
+    if ledger is not None and state[7] == 1.0:
+        ledger.usd_balance, ledger.btc_balance = float(state[2]), float(state[3])
+        ledger.last_trade_signal, ledger.trades = int(state[4]), int(state[5])
+        ledger.price = float(state[6])
+    return int(state[1])
+
+
+class Checkpointer:
+    """Saves a checkpoint after a closed candle at most once every interval seconds."""
+
+    def __init__(self, path, moving_averages=None, ledger=None, interval=60.0):
+        self.path = path
+        self.moving_averages = moving_averages
+        self.ledger = ledger
+        self.interval = interval
+        self.last_timestamp = None
+        self._last_save = 0.0
+
+    def restore(self):
+        self.last_timestamp = restore_checkpoint(self.path, self.moving_averages, self.ledger)
+        return self.last_timestamp
+
+    def save(self, last_timestamp, force=False):
+        """Records last_timestamp as the newest closed candle and writes a checkpoint if one is due."""
+        self.last_timestamp = last_timestamp
+        now = time.monotonic()
+        if force or now - self._last_save >= self.interval:
+            save_checkpoint(self.path, last_timestamp, self.moving_averages, self.ledger)
+            self._last_save = now
@@ -0,0 +1,156 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from candle_schema import to_epoch_ms
+
+
+class HistoryStore:
+    """Candles of one symbol and interval in memory-mapped column files under ``root/SYMBOL/interval/``.
+
+    Every column is a raw file of fixed-width values (``timestamp.bin`` holds the
+    epoch-ms open times, ``c.bin`` the closes, ...), all in timestamp order, with the
+    column dtypes in ``columns.json``. The sorted timestamp column is the index: a
+    time range is found with a binary search over the mapped file, so slice() touches
+    O(log n) pages and returns views on the files instead of reading them. Appends
+    only add rows newer than the last stored one, which makes re-appending the same
+    rows harmless. The timestamp column is written last and the shortest column
+    decides the length, so a crash mid-append leaves the store at the previous row.
+    """
+
+    def __init__(self, root, symbol, interval, columns=None):
+        self.directory = os.path.join(root, symbol.upper(), interval)
+        self.columns = {}  # name -> dtype, without the timestamp column
+        meta_path = os.path.join(self.directory, 'columns.json')
+        if os.path.exists(meta_path):
+            with open(meta_path) as meta:
+                self.columns = {name: np.dtype(dtype) for name, dtype in json.load(meta).items()}
+        elif columns:
+            self.columns = {name: np.dtype(dtype) for name, dtype in dict(columns).items()}
+        self._maps = {}
+        self._length = 0
+
+    def _path(self, name):
+        return os.path.join(self.directory, f"{name}.bin")
+
+    def _dtypes(self):
+        return {'timestamp': np.dtype('int64'), **self.columns}
+
+    def _stored_length(self):
+        lengths = []
+        for name, dtype in self._dtypes().items():
+            try:
+                lengths.append(os.path.getsize(self._path(name)) // dtype.itemsize)
+            except OSError:
+                return 0
+        return min(lengths)
+
+    def _refresh(self):
+        """Maps the files again if rows were appended since they were last mapped."""
+        length = self._stored_length() if self.columns else 0
+        if length != self._length or not self._maps:
+            self._maps = {
+                name: np.memmap(self._path(name), dtype=dtype, mode='r', shape=(length,)) if length
+                else np.empty(0, dtype=dtype)
+                for name, dtype in self._dtypes().items()
+            }
+            self._length = length
+
+    def __len__(self):
+        self._refresh()
+        return self._length
+
+    def last_timestamp(self):
+        """Open time of the newest stored candle, or None for an empty store."""
+        self._refresh()
+        return int(self._maps['timestamp'][-1]) if self._length else None
+
+    def _write_meta(self):
+        os.makedirs(self.directory, exist_ok=True)
+        meta_path = os.path.join(self.directory, 'columns.json')
+        with open(meta_path + '.tmp', 'w') as meta:
+            json.dump({name: dtype.str for name, dtype in self.columns.items()}, meta)
+        os.replace(meta_path + '.tmp', meta_path)
+
+    def append(self, rows):
+        """Appends {column: array} rows with a 'timestamp' column; returns how many were new.
+
+        The first append of a new store keeps every numeric column of rows. Later rows
+        missing a stored column get NaN (or 0 for integer columns); extra columns are ignored.
+        """
+        timestamps = np.asarray(rows['timestamp'], dtype='int64')
+        if not len(timestamps):
+            return 0
+        if not self.columns:
+            self.columns = {name: np.asarray(values).dtype for name, values in rows.items()
+                            if name != 'timestamp' and np.asarray(values).dtype.kind in 'biuf'}
+            self._write_meta()
+
+        last = self.last_timestamp()
+        order = np.argsort(timestamps, kind='stable')
+        timestamps = timestamps[order]
+        # Keep the last row of each open time, and only those newer than what is stored.
+        keep = np.append(timestamps[1:] != timestamps[:-1], True)
+        if last is not None:
+            keep &= timestamps > last
+        if not keep.any():
+            return 0
+        rows_kept = order[keep]
+
+        for name, dtype in self._dtypes().items():
+            path = self._path(name)
+            if os.path.exists(path) and os.path.getsize(path) > self._length * dtype.itemsize:
+                os.truncate(path, self._length * dtype.itemsize)  # Drop the tail of an interrupted append
+        for name, dtype in self.columns.items():
+            if name in rows:
+                values = np.asarray(rows[name])[rows_kept].astype(dtype, copy=False)
+            else:
+                values = np.full(len(rows_kept), np.nan if dtype.kind == 'f' else 0, dtype=dtype)
+            with open(self._path(name), 'ab') as column:
+                column.write(values.tobytes())
+        with open(self._path('timestamp'), 'ab') as column:
+            column.write(timestamps[keep].tobytes())
+        return len(rows_kept)
+
+    def search(self, timestamp, side='left'):
+        """Position of timestamp in the store, by binary search over the mapped timestamp column."""
+        self._refresh()
+        return int(np.searchsorted(self._maps['timestamp'], timestamp, side=side))
+
+    def slice(self, start=None, end=None, columns=None):
+        """The candles opened in [start, end) as {column: array}; the arrays are views on the mapped files."""
+        self._refresh()
+        first = 0 if start is None else self.search(start)
+        stop = self._length if end is None else self.search(end)
+        names = ['timestamp', *(columns or self.columns)]
+        return {name: self._maps[name][first:stop] for name in names}
+
+    def to_frame(self, start=None, end=None, columns=None):
+        """slice() as a DataFrame."""
+        return pd.DataFrame(self.slice(start, end, columns))
+
+
+def import_csv(path, store, chunk_size=1_000_000):
+    """Appends a price CSV with a 'datetime' column and numeric columns to store, chunk by chunk."""
+    appended = 0
+    for chunk in pd.read_csv(path, chunksize=chunk_size):
+        datetimes = pd.to_datetime(chunk.pop('datetime'), format='ISO8601', utc=True)
+        rows = {'timestamp': to_epoch_ms(datetimes)}
+        rows.update({name: chunk[name].to_numpy() for name in chunk if chunk[name].dtype.kind in 'biuf'})
+        appended += store.append(rows)
+    return appended
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Imports a price CSV into a memory-mapped history store.")
+    parser.add_argument("data_file", help="CSV file with a 'datetime' column")
+    parser.add_argument("root")
+    parser.add_argument("symbol")
+    parser.add_argument("interval")
+    args = parser.parse_args()
+
+    store = HistoryStore(args.root, args.symbol, args.interval)
+    print(f"Appended {import_csv(args.data_file, store)} rows, {len(store)} in {store.directory}")
@@ -0,0 +1,149 @@
+import math
+
+from indicators import RollingMean, crossover_signal
+
+
+class _Node:
+    """One indicator instance in the graph; inputs are row columns or the names of other nodes.
+
+    Subclasses define compute(values, commit), which returns the output for values (the
+    row columns and the outputs of the nodes before it) and only changes state if commit.
+    """
+
+    empty = math.nan  # Output of a candle that has no indicator values yet
+
+    def __init__(self, name, inputs):
+        self.name = name
+        self.inputs = inputs
+        self.refs = 0
+        self.value = self.empty
+
+
+class SmaNode(_Node):
+    """Simple moving average of a row column, the same values as MovingAverages."""
+
+    def __init__(self, name, source, period, decimals=3):
+        super().__init__(name, [source])
+        self.average = RollingMean(period, decimals)
+
+    def compute(self, values, commit):
+        value = values[self.inputs[0]]
+        return self.average.update(value) if commit else self.average.peek(value)
+
+
+class CrossoverNode(_Node):
+    """Crossover signal of two other nodes, the same values as the crossover columns of the live scripts."""
+
+    empty = 0
+
+    def __init__(self, name, short, long):
+        super().__init__(name, [short, long])
+        self.prev_short = math.nan
+        self.prev_long = math.nan
+
+    def compute(self, values, commit):
+        short, long = values[self.inputs[0]], values[self.inputs[1]]
+        signal = crossover_signal(self.prev_short, self.prev_long, short, long)
+        if commit:
+            self.prev_short, self.prev_long = short, long
+        return signal
+
+
+class IndicatorGraph:
+    """Indicators shared between strategies, each computed once per bar.
+
+    Nodes are keyed by (indicator, source column, params), so two strategies asking for
+    the 5-period SMA of 'c' get the same node. subscribe() returns the name under which
+    the output appears in the dict returned by update(); a crossover subscribes to the
+    two SMAs it reads, so 5/10, 5/20 and 10/20 crossovers share three SMAs. Every node
+    counts its subscribers and is evicted, together with inputs nothing else uses,
+    once the last of them unsubscribes. Nodes added while running start warming up
+    with the next bar. A bar is identified by its 'timestamp' column: when owners of a
+    shared graph, e.g. a KlineIngestor and a ConfigBook, both feed it the same bar it
+    is committed once and the later calls get the outputs already committed for it.
+    """
+
+    def __init__(self, decimals=3):
+        self.decimals = decimals
+        self.nodes = {}  # key -> node, in dependency order
+        self._subscriptions = {}  # owner -> keys it subscribed to
+        self.timestamp = None  # 'timestamp' of the last committed bar
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def _acquire(self, key):
+        node = self.nodes.get(key)
+        if node is None:
+            indicator, source, params = key
+            name = '_'.join([indicator, source] + [str(param) for param in params])
+            if indicator == 'sma':
+                node = SmaNode(name, source, params[0], self.decimals)
+            elif indicator == 'crossover':
+                short = self._acquire(('sma', source, (params[0],)))
+                long = self._acquire(('sma', source, (params[1],)))
+                node = CrossoverNode(name, short.name, long.name)
+            else:
+                raise ValueError(f"Unknown indicator {indicator!r}, expected 'sma' or 'crossover'")
+            self.nodes[key] = node
+        node.refs += 1
+        return node
+
+    def _release(self, key):
+        node = self.nodes[key]
+        node.refs -= 1
+        if node.refs == 0:
+            del self.nodes[key]
+            indicator, source, params = key
+            if indicator == 'crossover':
+                self._release(('sma', source, (params[0],)))
+                self._release(('sma', source, (params[1],)))
+
+    def subscribe(self, owner, indicator, source='c', *params):
+        """Registers owner's use of an indicator, e.g. subscribe(strategy, 'crossover', 'c', 5, 10).
+
+        Returns the name of the output, e.g. 'crossover_c_5_10'.
+        """
+        key = (indicator, source, tuple(params))
+        node = self._acquire(key)
+        self._subscriptions.setdefault(owner, []).append(key)
+        return node.name
+
+    def unsubscribe(self, owner):
+        """Drops every subscription of owner and evicts the nodes nothing uses anymore."""
+        for key in self._subscriptions.pop(owner, []):
+            self._release(key)
+
+    def _evaluate(self, row, commit):
+        values = dict(row)
+        outputs = {}
+        for node in list(self.nodes.values()):
+            value = node.compute(values, commit)
+            values[node.name] = outputs[node.name] = value
+            if commit:
+                node.value = value
+        return outputs
+
+    def update(self, row):
+        """Feeds a closed bar (a dict with the source columns) to every node once; returns {name: value}.
+
+        A row with the same 'timestamp' as the last committed one is not committed again.
+        """
+        timestamp = row.get('timestamp')
+        if timestamp is not None:
+            if timestamp == self.timestamp:
+                return self.values()
+            self.timestamp = timestamp
+        return self._evaluate(row, commit=True)
+
+    def peek(self, row):
+        """Returns {name: value} as if row were added, without committing it to any node."""
+        return self._evaluate(row, commit=False)
+
+    def empty(self):
+        """Returns {name: value} for a candle that has no indicator values yet."""
+        return {node.name: node.empty for node in self.nodes.values()}
+
+    def values(self):
+        """Returns the latest committed output of every node."""
+        return {node.name: node.value for node in self.nodes.values()}
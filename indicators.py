@@ -0,0 +1,104 @@
+from collections import deque
+import math
+
+import numpy as np
+
+
+class RollingMean:
+    """Moving average over a fixed-size window, updated in O(1) per value.
+
+    Mirrors the compensated running sum used by pandas ``rolling().mean()``
+    so that values match ``rolling(window=period, min_periods=period)``.
+    """
+
+    def __init__(self, period, decimals=3):
+        self.period = period
+        self.decimals = decimals
+        self.window = deque(maxlen=period)
+        self.value = math.nan
+        self._state = (0, 0.0, 0.0, 0.0, 0, 0, math.nan)
+
+    def _step(self, value):
+        """Returns the state and mean after adding value, without storing either."""
+        nobs, sum_x, comp_add, comp_remove, neg_ct, same_ct, prev_value = self._state
+        if self.period == 1 or not self.window:
+            # pandas starts over whenever the new window does not overlap the old one.
+            nobs, sum_x, comp_add, comp_remove, neg_ct, same_ct = 0, 0.0, 0.0, 0.0, 0, 0
+        elif len(self.window) == self.period:
+            # Remove the value falling out of the window.
+            old = self.window[0]
+            nobs -= 1
+            y = -old - comp_remove
+            t = sum_x + y
+            comp_remove = t - sum_x - y
+            sum_x = t
+            if math.copysign(1.0, old) < 0:
+                neg_ct -= 1
+
+        # Add the newest value.
+        nobs += 1
+        y = value - comp_add
+        t = sum_x + y
+        comp_add = t - sum_x - y
+        sum_x = t
+        if math.copysign(1.0, value) < 0:
+            neg_ct += 1
+        same_ct = same_ct + 1 if value == prev_value else 1
+        prev_value = value
+
+        if nobs < self.period:
+            mean = math.nan
+        elif same_ct >= nobs:
+            mean = prev_value
+        elif neg_ct == 0 and sum_x / nobs < 0:
+            mean = 0.0
+        elif neg_ct == nobs and sum_x / nobs > 0:
+            mean = 0.0
+        else:
+            mean = sum_x / nobs
+
+        if self.decimals is not None:
+            mean = float(np.round(mean, self.decimals))
+        return (nobs, sum_x, comp_add, comp_remove, neg_ct, same_ct, prev_value), mean
+
+    def update(self, value):
+        """Adds a new value to the window and returns the (rounded) moving average."""
+        value = float(value)
+        self._state, self.value = self._step(value)
+        self.window.append(value)
+        return self.value
+
+    def peek(self, value):
+        """Returns the moving average that update(value) would give, leaving the window unchanged."""
+        return self._step(float(value))[1]
+
+
+class MovingAverages:
+    """Keeps one RollingMean per configured period."""
+
+    def __init__(self, periods, decimals=3):
+        self.averages = {period: RollingMean(period, decimals) for period in periods}
+
+    def update(self, close):
+        """Feeds a close price to every period and returns {period: moving average}."""
+        return {period: average.update(close) for period, average in self.averages.items()}
+
+    def peek(self, close):
+        """Returns {period: moving average} as if close were added, without adding it."""
+        return {period: average.peek(close) for period, average in self.averages.items()}
+
+    def values(self):
+        """Returns the latest moving average for every period."""
+        return {period: average.value for period, average in self.averages.items()}
+
+
+def crossover_signal(prev_short, prev_long, short, long):
+    """Returns 1 when the short MA crosses above the long MA, -1 when it crosses below, 0 otherwise.
+
+    NaN values never produce a cross, the same as the DataFrame based crossover functions.
+    """
+    if short > long and prev_short <= prev_long:
+        return 1
+    if short < long and prev_short >= prev_long:
+        return -1
+    return 0
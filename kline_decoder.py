@@ -0,0 +1,156 @@
+import json
+import time
+from collections import namedtuple
+
+import numpy as np
+
+try:
+    import msgspec
+except ImportError:  # msgspec is optional, orjson or the json module are used instead
+    msgspec = None
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+# A kline event with its fields already converted to numbers. interval is only set on bars
+# built locally from trades (trade_bars.py), where one stream yields several intervals.
+Kline = namedtuple("Kline", ["symbol", "open_time", "close_time", "open", "high", "low", "close", "volume",
+                             "closed", "interval"], defaults=(None,))
+
+KLINE_DTYPES = {
+    'symbol': object,
+    'open_time': 'int64',
+    'close_time': 'int64',
+    'open': 'float64',
+    'high': 'float64',
+    'low': 'float64',
+    'close': 'float64',
+    'volume': 'float64',
+    'closed': 'bool',
+}
+
+
+if msgspec is not None:
+    class _KlineFields(msgspec.Struct):
+        t: int
+        T: int
+        o: float
+        h: float
+        l: float
+        c: float
+        v: float
+        x: bool
+
+    class _KlineEvent(msgspec.Struct):
+        s: str
+        k: _KlineFields
+
+    class _CombinedKlineEvent(msgspec.Struct):
+        data: _KlineEvent
+
+    # strict=False lets msgspec parse the price strings Binance sends straight into floats.
+    _event_decoder = msgspec.json.Decoder(_KlineEvent, strict=False)
+    _combined_decoder = msgspec.json.Decoder(_CombinedKlineEvent, strict=False)
+    _event_list_decoder = msgspec.json.Decoder(list[_KlineEvent], strict=False)
+    _combined_list_decoder = msgspec.json.Decoder(list[_CombinedKlineEvent], strict=False)
+
+    def _is_combined(frame):
+        return frame[:9] in (b'{"stream"', '{"stream"')
+
+    def decode_kline(frame):
+        """Decodes one raw kline frame (plain or combined stream) into a Kline."""
+        if _is_combined(frame):
+            event = _combined_decoder.decode(frame).data
+        else:
+            event = _event_decoder.decode(frame)
+        k = event.k
+        return Kline(event.s, k.t, k.T, k.o, k.h, k.l, k.c, k.v, k.x)
+
+    def _decode_klines(frames):
+        # Joining the frames into one JSON array decodes the whole batch in a single call.
+        joined = b'[' + b','.join(frame if isinstance(frame, bytes) else frame.encode() for frame in frames) + b']'
+        if _is_combined(frames[0]):
+            events = [wrapper.data for wrapper in _combined_list_decoder.decode(joined)]
+        else:
+            events = _event_list_decoder.decode(joined)
+        return [(event.s, event.k.t, event.k.T, event.k.o, event.k.h, event.k.l, event.k.c, event.k.v, event.k.x)
+                for event in events]
+
+else:
+    def decode_kline(frame):
+        """Decodes one raw kline frame (plain or combined stream) into a Kline."""
+        event = _loads(frame)
+        event = event.get('data', event)
+        k = event['k']
+        return Kline(event['s'], k['t'], k['T'], float(k['o']), float(k['h']), float(k['l']), float(k['c']),
+                     float(k['v']), k['x'])
+
+    def _decode_klines(frames):
+        return [decode_kline(frame) for frame in frames]
+
+
+def decode_batch(frames):
+    """Decodes a list of raw frames (all plain or all combined stream) into {field: NumPy array} columns."""
+    if not frames:
+        return {field: np.empty(0, dtype=dtype) for field, dtype in KLINE_DTYPES.items()}
+    columns = zip(*_decode_klines(frames))
+    return {field: np.array(values, dtype=dtype) for (field, dtype), values in zip(KLINE_DTYPES.items(), columns)}
+
+
+def _decode_with_dicts(frame):
+    """The decoding the live scripts used before: json.loads and per-field dict lookups."""
+    message_data = json.loads(frame)
+    return {
+        'timestamp': message_data['k']['t'],
+        'pair': message_data['s'],
+        'o': message_data['k']['o'],
+        'h': message_data['k']['h'],
+        'l': message_data['k']['l'],
+        'c': float(message_data['k']['c']),
+        'v': message_data['k']['v'],
+    }
+
+
+def synthetic_frames(count, symbol="BTCUSDT"):
+    """Builds raw kline frames shaped like the Binance payload."""
+    frames = []
+    for i in range(count):
+        price = 60000 + (i % 500) * 0.37
+        frames.append(json.dumps({
+            "e": "kline", "E": 1700000000000 + i * 250, "s": symbol,
+            "k": {
+                "t": 1700000000000 + (i // 240) * 60000, "T": 1700000059999 + (i // 240) * 60000, "s": symbol,
+                "i": "1m", "f": 100 + i, "L": 200 + i, "o": f"{price:.2f}", "c": f"{price + 1.5:.2f}",
+                "h": f"{price + 3:.2f}", "l": f"{price - 3:.2f}", "v": "12.345", "n": 100, "x": i % 240 == 239,
+                "q": "740000.12", "V": "6.1", "Q": "370000.5", "B": "0",
+            },
+        }).encode())
+    return frames
+
+
+if __name__ == "__main__":
+    # Micro-benchmark of the decoding paths on synthetic frames.
+    frames = synthetic_frames(200_000)
+    backend = "msgspec" if msgspec is not None else ("orjson" if _loads is not json.loads else "json")
+
+    start = time.perf_counter()
+    for frame in frames:
+        _decode_with_dicts(frame)
+    baseline = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for frame in frames:
+        decode_kline(frame)
+    typed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    decode_batch(frames)
+    batch = time.perf_counter() - start
+
+    print(f"{len(frames)} frames, decoder backend: {backend}")
+    print(f"json.loads + dict lookups : {baseline:.3f}s ({len(frames) / baseline:,.0f} msg/s)")
+    print(f"decode_kline              : {typed:.3f}s ({len(frames) / typed:,.0f} msg/s, {baseline / typed:.1f}x)")
+    print(f"decode_batch              : {batch:.3f}s ({len(frames) / batch:,.0f} msg/s, {baseline / batch:.1f}x)")
@@ -0,0 +1,115 @@
+import contextlib
+import math
+
+from indicators import crossover_signal
+
+_NOT_TIMED = contextlib.nullcontext()
+
+
+class KlineIngestor:
+    """Stores kline updates keyed by candle open time ('timestamp', k.t).
+
+    Binance pushes many updates for the candle that is still forming. Those overwrite
+    the newest row in place instead of adding rows, and the candle is finalized when
+    an update arrives with k.x set. Indicators and signals are computed when a candle
+    closes, or on every update with signal_mode='tick'. Ticks only preview the moving
+    averages; they are committed once per closed candle. An IndicatorGraph passed as
+    graph adds the outputs its subscribers asked for under their output names.
+
+    With a Metrics instance the indicator and strategy steps are timed as the
+    'indicators' and 'strategy' stages, and ignored repeats are counted as drops.
+    """
+
+    def __init__(self, candles, moving_averages=None, ma_column='ma{period}', cross_column=None,
+                 crossover_periods=None, signal_mode='close', strategy=None, metrics=None,
+                 graph=None):
+        if signal_mode not in ('close', 'tick'):
+            raise ValueError(f"Unknown signal_mode {signal_mode!r}, expected 'close' or 'tick'")
+        self.candles = candles
+        self.moving_averages = moving_averages
+        self.ma_column = ma_column
+        self.cross_column = cross_column
+        self.crossover_periods = crossover_periods
+        self.signal_mode = signal_mode
+        self.strategy = strategy  # Called with each row before it is stored, e.g. to add balances
+        self.graph = graph
+        self.closed = True  # Whether the newest stored candle has been finalized
+        self.metrics = metrics
+        self._time = metrics.time if metrics is not None else lambda stage: _NOT_TIMED
+        if metrics is not None:
+            metrics.count('drops', 0)  # Report the counter before the first drop
+
+    def _add_signals(self, row, commit):
+        """Adds moving averages and the crossover to row, committing the close to the windows if final."""
+        if self.moving_averages is not None:
+            with self._time('indicators'):
+                prev_mas = self.moving_averages.values()
+                if commit:
+                    mas = self.moving_averages.update(row['c'])
+                else:
+                    mas = self.moving_averages.peek(row['c'])
+                for period, value in mas.items():
+                    row[self.ma_column.format(period=period)] = value
+                if self.cross_column:
+                    short_period, long_period = self.crossover_periods
+                    row[self.cross_column] = crossover_signal(prev_mas[short_period], prev_mas[long_period],
+                                                              mas[short_period], mas[long_period])
+        if self.graph is not None:
+            with self._time('indicators'):
+                row.update(self.graph.update(row) if commit else self.graph.peek(row))
+        if self.strategy is not None:
+            with self._time('strategy'):
+                self.strategy(row)
+        return row
+
+    def _without_signals(self, row):
+        """Marks the indicator columns of a forming candle as not yet available."""
+        if self.moving_averages is not None:
+            for period in self.moving_averages.averages:
+                row[self.ma_column.format(period=period)] = math.nan
+            if self.cross_column:
+                row[self.cross_column] = 0
+        if self.graph is not None:
+            row.update(self.graph.empty())
+        if self.strategy is not None:
+            self.strategy(row)
+        return row
+
+    def ingest(self, data, is_closed):
+        """Stores one kline update and returns True if indicators and signals were computed for it."""
+        last = self.candles.last() if len(self.candles) else None
+        same_candle = last is not None and last['timestamp'] == data['timestamp']
+
+        if same_candle and self.closed:
+            # Repeated update for a candle that is already final; nothing changes.
+            if self.metrics is not None:
+                self.metrics.count('drops')
+            return False
+        if last is not None and not same_candle and not self.closed:
+            # The previous candle never reported x=true (e.g. after a reconnect), finalize it as it stands.
+            self.candles.update_last(self._add_signals(dict(last), commit=True))
+
+        data = dict(data)
+        fired = is_closed or self.signal_mode == 'tick'
+        if fired:
+            row = self._add_signals(data, commit=is_closed)
+        else:
+            row = self._without_signals(data)
+        if same_candle:
+            self.candles.update_last(row)
+        else:
+            self.candles.append(row)
+        self.closed = is_closed
+        return fired
+
+    def warm_up(self, rows):
+        """Stores closed historical rows, e.g. from a backfill, to seed the candles and indicator windows.
+
+        The strategy is not called for them, so no trades are simulated on history.
+        """
+        strategy, self.strategy = self.strategy, None
+        try:
+            for row in rows:
+                self.ingest(row, True)
+        finally:
+            self.strategy = strategy
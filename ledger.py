@@ -0,0 +1,88 @@
+import numpy as np
+
+
+class PortfolioLedger:
+    """Streaming USD/BTC ledger for the v5 fractional crossover strategy.
+
+    Each bar is applied once, so the cost per message does not depend on how much
+    history has been collected. With an order book (an order_book.OrderBook kept
+    up to date by a depth feed) trades fill at the average price of walking the book
+    for the order size instead of at the candle price.
+    """
+
+    def __init__(self, usd_balance, btc_balance, buy_trade_percentage, sell_trade_percentage, leverage=1,
+                 last_trade_signal=0, book=None):
+        self.usd_balance = float(usd_balance)
+        self.btc_balance = float(btc_balance)
+        self.buy_trade_percentage = buy_trade_percentage
+        self.sell_trade_percentage = sell_trade_percentage
+        self.leverage = leverage
+        self.last_trade_signal = last_trade_signal  # Tracks the last signal that triggered a trade
+        self.price = 0.0
+        self.trades = 0
+        self.book = book
+
+    def fill_price(self, side, price, quantity=None, quote=None):
+        """Average price of a market order for quantity BTC or quote USD; price when there is no book to walk."""
+        if self.book is None:
+            return price
+        fill = self.book.average_price(side, quantity, quote)
+        return price if fill is None else fill
+
+    def apply(self, signal, price):
+        """Applies the newest cross signal at price and returns (usd_balance, btc_balance, total_portfolio_value)."""
+        if signal in (1, -1) and signal != self.last_trade_signal:
+            if signal == 1:  # Buy signal
+                buy_amount_usd = self.usd_balance * self.buy_trade_percentage
+                btc_bought = (buy_amount_usd / self.fill_price(1, price, quote=buy_amount_usd * self.leverage)) \
+                    * self.leverage
+                self.usd_balance -= buy_amount_usd
+                self.btc_balance += btc_bought
+            else:  # Sell signal
+                btc_sold = self.btc_balance * self.sell_trade_percentage
+                usd_earned = (btc_sold * self.fill_price(-1, price, quantity=btc_sold * self.leverage)) \
+                    * self.leverage
+                self.usd_balance += usd_earned
+                self.btc_balance -= btc_sold
+            self.last_trade_signal = signal
+            self.trades += 1
+        self.price = price
+        return self.usd_balance, self.btc_balance, self.usd_balance + (self.btc_balance * price)
+
+    def snapshot(self):
+        """Returns the current balances and total value at the last applied price."""
+        return {
+            'usd_balance': self.usd_balance,
+            'btc_balance': self.btc_balance,
+            'total_portfolio_value': self.usd_balance + (self.btc_balance * self.price),
+        }
+
+
+def apply_signals(usd_balance, btc_balance, last_trade_signal, signal, price, buy_trade_percentage,
+                  sell_trade_percentage, leverage=1):
+    """PortfolioLedger.apply for arrays of independent ledgers, updating the balance arrays in place.
+
+    price and the sizing parameters may be scalars or one value per ledger. Returns the
+    boolean mask of the ledgers that traded.
+    """
+    trade = (signal != 0) & (signal != last_trade_signal)
+    if not trade.any():
+        return trade
+    shape = usd_balance.shape
+    price = np.broadcast_to(price, shape)
+    buy_trade_percentage = np.broadcast_to(buy_trade_percentage, shape)
+    sell_trade_percentage = np.broadcast_to(sell_trade_percentage, shape)
+    leverage = np.broadcast_to(leverage, shape)
+    buy = np.flatnonzero(trade & (signal == 1))
+    sell = np.flatnonzero(trade & (signal == -1))
+
+    buy_amount_usd = usd_balance[buy] * buy_trade_percentage[buy]
+    btc_balance[buy] += (buy_amount_usd / price[buy]) * leverage[buy]
+    usd_balance[buy] -= buy_amount_usd
+
+    btc_sold = btc_balance[sell] * sell_trade_percentage[sell]
+    usd_balance[sell] += (btc_sold * price[sell]) * leverage[sell]
+    btc_balance[sell] -= btc_sold
+
+    last_trade_signal[trade] = signal[trade]
+    return trade
@@ -0,0 +1,141 @@
+import signal
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# Quantiles reported for every stage, computed over the most recent samples.
+QUANTILES = (0.5, 0.99)
+
+
+class LatencySummary:
+    """Count, sum and max of a stage's latencies plus a ring of recent samples for quantiles."""
+
+    def __init__(self, window=4096):
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._samples = np.zeros(window)
+
+    def observe(self, seconds):
+        self._samples[self.count % len(self._samples)] = seconds
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantiles(self, quantiles=QUANTILES):
+        samples = self._samples[:min(self.count, len(self._samples))]
+        if not len(samples):
+            return {q: float('nan') for q in quantiles}
+        return dict(zip(quantiles, np.quantile(samples, quantiles)))
+
+
+class _StageTimer:
+    """Context manager that adds the time spent in its block to a LatencySummary."""
+
+    __slots__ = ('summary', 'start')
+
+    def __init__(self, summary):
+        self.summary = summary
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.summary.observe(time.perf_counter() - self.start)
+
+
+class Metrics:
+    """Per-stage latency summaries and counters of a live bot, rendered in Prometheus text format.
+
+    Wrap a stage with ``with metrics.time('decode'):``; the timers are created once per
+    stage, so the hot path only pays for two perf_counter calls. Counters are either
+    incremented with count() or read from a function when the metrics are rendered;
+    gauges such as queue depths are always read from a function.
+    """
+
+    def __init__(self, prefix='binance_bot'):
+        self.prefix = prefix
+        self.stages = {}
+        self.counters = {}
+        self._timers = {}
+        self._counter_functions = {}
+        self._gauge_functions = {}
+        self._server = None
+
+    def time(self, stage):
+        timer = self._timers.get(stage)
+        if timer is None:
+            self.stages[stage] = LatencySummary()
+            timer = self._timers[stage] = _StageTimer(self.stages[stage])
+        return timer
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def counter(self, name, function):
+        """Reports function() as the counter name, e.g. the number of trades a ledger made."""
+        self._counter_functions[name] = function
+
+    def gauge(self, name, function):
+        """Reports function() as the gauge name, e.g. the current depth of a queue."""
+        self._gauge_functions[name] = function
+
+    def render(self):
+        """Returns all metrics in the Prometheus text exposition format."""
+        name = f"{self.prefix}_stage_latency_seconds"
+        lines = [f"# HELP {name} Time spent in each stage of on_message.", f"# TYPE {name} summary"]
+        for stage, summary in list(self.stages.items()):
+            for quantile, value in summary.quantiles().items():
+                lines.append(f'{name}{{stage="{stage}",quantile="{quantile}"}} {value:.9f}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {summary.sum:.9f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {summary.count}')
+        lines.append(f"# TYPE {name}_max gauge")
+        for stage, summary in list(self.stages.items()):
+            lines.append(f'{name}_max{{stage="{stage}"}} {summary.max:.9f}')
+
+        counters = dict(self.counters)
+        counters.update((counter, function()) for counter, function in self._counter_functions.items())
+        for counter, value in counters.items():
+            lines.append(f"# TYPE {self.prefix}_{counter}_total counter")
+            lines.append(f"{self.prefix}_{counter}_total {value}")
+        for gauge, function in list(self._gauge_functions.items()):
+            lines.append(f"# TYPE {self.prefix}_{gauge} gauge")
+            lines.append(f"{self.prefix}_{gauge} {function()}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host='127.0.0.1'):
+        """Serves the metrics on http://host:port/metrics from a daemon thread."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # Keep scrapes out of the bot's output
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        return self._server
+
+    def dump_on_signal(self, signum=getattr(signal, 'SIGUSR1', None)):
+        """Writes the metrics to stderr whenever the process receives signum (SIGUSR1 by default).
+
+        Does nothing on platforms without the signal, e.g. SIGUSR1 on Windows.
+        """
+        if signum is None:
+            return
+        signal.signal(signum, lambda sig, frame: sys.stderr.write(self.render()))
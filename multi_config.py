@@ -0,0 +1,154 @@
+import itertools
+import os
+import signal
+import sys
+
+import numpy as np
+import pandas as pd
+import websocket
+
+from indicator_graph import IndicatorGraph
+from ledger import apply_signals
+from pipeline import FramePipeline
+
+
+class ConfigBook:
+    """Paper-trades many (short, long, trade_percentage) crossover configurations on one feed.
+
+    The book subscribes to the SMA of 'c' for every distinct period in an IndicatorGraph
+    and feeds it each closed candle, so every period is averaged once per bar; other
+    subscribers of a shared graph read their outputs with graph.values() after
+    update(). Passing the candle's timestamp lets the book share a graph with a
+    KlineIngestor that already fed it the bar, and makes a repeated bar a no-op.
+    Each configuration then only gathers its two averages. Signals and
+    v5-style balances are kept in one array per field and updated for all
+    configurations in a single vectorized step, so a bar costs one rolling mean per
+    distinct period plus a few NumPy operations over the configurations.
+    """
+
+    def __init__(self, configs, usd_balance=10000, btc_balance=1, leverage=1, decimals=3, graph=None):
+        configs = list(configs)
+        self.short = np.array([short for short, long, percentage in configs], dtype='int64')
+        self.long = np.array([long for short, long, percentage in configs], dtype='int64')
+        self.trade_percentage = np.array([percentage for short, long, percentage in configs], dtype='float64')
+        if (self.short >= self.long).any():
+            raise ValueError("every configuration needs short < long")
+        periods = sorted(set(self.short.tolist()) | set(self.long.tolist()))
+        self.graph = graph if graph is not None else IndicatorGraph(decimals)
+        self._outputs = [self.graph.subscribe(self, 'sma', 'c', period) for period in periods]
+        self._short_index = np.searchsorted(periods, self.short)
+        self._long_index = np.searchsorted(periods, self.long)
+
+        count = len(configs)
+        self.leverage = leverage
+        self.usd_balance = np.full(count, float(usd_balance))
+        self.btc_balance = np.full(count, float(btc_balance))
+        self.last_trade_signal = np.zeros(count, dtype='int8')
+        self.trades = np.zeros(count, dtype='int64')
+        self.prev_short_ma = np.full(count, np.nan)
+        self.prev_long_ma = np.full(count, np.nan)
+        self.price = np.nan
+        self.bars = 0
+        self.timestamp = None  # Open time of the last candle fed with a timestamp
+
+    def __len__(self):
+        return len(self.short)
+
+    def update(self, close, timestamp=None):
+        """Feeds one closed candle to every configuration; returns the mask of configurations that traded."""
+        if timestamp is not None:
+            if timestamp == self.timestamp:
+                return np.zeros(len(self), dtype=bool)
+            self.timestamp = timestamp
+        outputs = self.graph.update({'c': close} if timestamp is None else {'timestamp': timestamp, 'c': close})
+        mas = np.array([outputs[name] for name in self._outputs])
+        short_ma = mas[self._short_index]
+        long_ma = mas[self._long_index]
+        with np.errstate(invalid='ignore'):
+            cross = np.where((short_ma > long_ma) & (self.prev_short_ma <= self.prev_long_ma), 1,
+                             np.where((short_ma < long_ma) & (self.prev_short_ma >= self.prev_long_ma), -1, 0))
+        self.prev_short_ma, self.prev_long_ma = short_ma, long_ma
+
+        traded = apply_signals(self.usd_balance, self.btc_balance, self.last_trade_signal, cross, close,
+                               self.trade_percentage, self.trade_percentage, self.leverage)
+        self.trades += traded
+        self.price = close
+        self.bars += 1
+        return traded
+
+    def close(self):
+        """Unsubscribes from the graph; its averages are evicted unless other subscribers use them."""
+        self.graph.unsubscribe(self)
+
+    def total_portfolio_value(self):
+        return self.usd_balance + (self.btc_balance * self.price)
+
+    def leaderboard(self, top=10):
+        """The top configurations by total portfolio value at the last price."""
+        total = self.total_portfolio_value()
+        best = np.argsort(-total, kind='stable')[:top]
+        return pd.DataFrame({
+            'short': self.short[best],
+            'long': self.long[best],
+            'trade_percentage': self.trade_percentage[best],
+            'trades': self.trades[best],
+            'usd_balance': self.usd_balance[best],
+            'btc_balance': self.btc_balance[best],
+            'total_portfolio_value': total[best],
+        })
+
+
+def config_grid(shorts, longs, trade_percentages):
+    """Every (short, long, trade_percentage) combination with short < long."""
+    return [(short, long, percentage) for short, long, percentage in itertools.product(shorts, longs, trade_percentages)
+            if short < long]
+
+
+def on_kline(kline):
+    if not kline.closed:
+        return
+    book.update(kline.close, kline.open_time)
+    if book.bars % leaderboard_every == 0:
+        print(f"{kline.symbol} {kline.open_time} c={kline.close} after {book.bars} candles:")
+        print(book.leaderboard(leaderboard_size).to_string(index=False))
+
+
+def on_message(ws, message):
+    pipeline.put(message)
+
+
+def on_error(ws, error):
+    print(error)
+
+
+def on_close(ws, *args, **kwargs):
+    print("Connection closed")
+    pipeline.close()
+    print(book.leaderboard(leaderboard_size).to_string(index=False))
+
+
+def subscribe_to_stream(symbol, interval, stream_url="wss://stream.binancefuture.com/ws"):
+    ws_url = f"{stream_url}/{symbol.lower()}@kline_{interval}"
+    return websocket.WebSocketApp(ws_url, on_message=on_message, on_error=on_error, on_close=on_close)
+
+
+def signal_handler(sig, frame):
+    print('Interrupt received, stopping…')
+    ws.close()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    symbol = "BTCUSDT"
+    interval = "1m"
+    stream_url = os.environ.get("BINANCE_STREAM_URL", "wss://stream.binancefuture.com/ws")
+    configs = config_grid(range(3, 31, 3), range(10, 121, 10), [0.05, 0.1, 0.2])
+    book = ConfigBook(configs, usd_balance=10000, btc_balance=1, leverage=1)
+    leaderboard_every = 1  # Closed candles between leaderboard prints
+    leaderboard_size = 10
+    pipeline = FramePipeline(on_kline)
+
+    print(f"Paper-trading {len(book)} configurations on {symbol} with interval {interval}")
+    ws = subscribe_to_stream(symbol, interval, stream_url)
+    signal.signal(signal.SIGINT, signal_handler)
+    ws.run_forever()
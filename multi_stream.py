@@ -0,0 +1,143 @@
+import asyncio
+import traceback
+
+import websockets
+
+from candle_schema import candle_columns
+from candle_store import CandleStore
+from indicators import MovingAverages
+from kline_decoder import decode_kline
+from kline_ingest import KlineIngestor
+from ledger import PortfolioLedger
+from order_book import DepthFeed
+
+BASE_URL = "wss://stream.binancefuture.com"
+# Binance caps the number of streams a single combined connection may carry.
+MAX_STREAMS_PER_CONNECTION = 200
+# Frames of this process that failed to decode or whose handling raised; they are skipped.
+frame_errors = 0
+
+
+class SymbolState:
+    """Candles, moving averages and the v5 paper-trading ledger for one symbol."""
+
+    def __init__(self, symbol, ma_periods=(5, 10), usd_balance=10000, btc_balance=1, buy_trade_percentage=0.1,
+                 sell_trade_percentage=0.1, leverage=1, signal_mode='close', capacity=None,
+                 price_dtype='float64'):
+        self.symbol = symbol.upper()
+        self.candles = CandleStore(candle_columns(('c', 'v'), price_dtype), capacity=capacity)
+        self.moving_averages = MovingAverages(ma_periods)
+        self.ledger = PortfolioLedger(usd_balance, btc_balance, buy_trade_percentage, sell_trade_percentage, leverage)
+        self.ingestor = KlineIngestor(self.candles, self.moving_averages, cross_column='cross',
+                                      crossover_periods=list(ma_periods), signal_mode=signal_mode,
+                                      strategy=self.add_portfolio_balance)
+        self.messages = 0
+
+    def add_portfolio_balance(self, row):
+        row['usd_balance'], row['btc_balance'], row['total_portfolio_value'] = self.ledger.apply(row['cross'], row['c'])
+
+    def on_kline(self, kline):
+        """Ingests one decoded Kline and returns True if signals were computed for it."""
+        self.messages += 1
+        data = {
+            'timestamp': kline.open_time,
+            'pair': kline.symbol,
+            'c': kline.close,
+            'v': kline.volume,
+        }
+        return self.ingestor.ingest(data, kline.closed)
+
+
+def combined_stream_url(symbols, interval, base_url=BASE_URL):
+    """Builds the combined-stream URL carrying the kline stream of every symbol."""
+    streams = '/'.join(f"{symbol.lower()}@kline_{interval}" for symbol in symbols)
+    return f"{base_url}/stream?streams={streams}"
+
+
+def dispatch(states, message):
+    """Routes one raw combined-stream frame to its symbol; returns (state, fired) or (None, False)."""
+    kline = decode_kline(message)
+    state = states.get(kline.symbol)
+    if state is None:
+        return None, False
+    return state, state.on_kline(kline)
+
+
+async def consume(url, states, on_update=None, reconnect=True, reconnect_delay=1.0, max_reconnect_delay=30.0):
+    """Reads one combined-stream connection, reconnecting with backoff when it drops.
+
+    A frame that fails to decode or whose handling raises is reported, counted in
+    frame_errors and skipped, so it never ends the streams of the other symbols.
+    """
+    global frame_errors
+    delay = reconnect_delay
+    while True:
+        try:
+            async with websockets.connect(url, max_size=None) as ws:
+                delay = reconnect_delay
+                async for message in ws:
+                    try:
+                        state, fired = dispatch(states, message)
+                        if on_update is not None and state is not None:
+                            on_update(state, fired)
+                    except Exception:
+                        frame_errors += 1
+                        traceback.print_exc()
+        except (OSError, websockets.ConnectionClosed) as error:
+            print(f"{url}: {error}")
+        if not reconnect:
+            return
+        print(f"Reconnecting in {delay:.0f}s")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, max_reconnect_delay)
+
+
+async def subscribe(states, interval, base_url=BASE_URL, on_update=None, reconnect=True,
+                    streams_per_connection=MAX_STREAMS_PER_CONNECTION):
+    """Subscribes to the kline stream of every symbol in states within one event loop."""
+    symbols = list(states)
+    urls = [
+        combined_stream_url(symbols[i:i + streams_per_connection], interval, base_url)
+        for i in range(0, len(symbols), streams_per_connection)
+    ]
+    await asyncio.gather(*(consume(url, states, on_update, reconnect) for url in urls))
+
+
+def print_closed_candle(state, fired):
+    """Prints one line per symbol whenever signals were computed."""
+    if fired:
+        row = state.candles.last()
+        print(f"{row['pair']} {row['timestamp']} c={row['c']} cross={row['cross']} "
+              f"total={row['total_portfolio_value']:.2f}")
+
+
+def print_summary(states):
+    """Prints every symbol's portfolio snapshot, best total value first."""
+    snapshots = sorted(((state.ledger.snapshot(), state) for state in states.values()),
+                       key=lambda item: item[0]['total_portfolio_value'], reverse=True)
+    for snapshot, state in snapshots:
+        print(f"{state.symbol:<12} messages={state.messages:<8} usd={snapshot['usd_balance']:.2f} "
+              f"base={snapshot['btc_balance']:.6f} total={snapshot['total_portfolio_value']:.2f}")
+    if frame_errors:
+        print(f"Skipped {frame_errors} frames that failed")
+
+
+if __name__ == "__main__":
+    symbols = ["BTCUSDT", "ETHUSDT", "BNBUSDT", "SOLUSDT", "XRPUSDT"]
+    interval = "1m"
+    ma_periods = [5, 10]
+
+    # Walk each symbol's local order book, kept from one combined @depth@100ms stream, for simulated fills.
+    fill_from_order_book = False
+
+    states = {symbol: SymbolState(symbol, ma_periods) for symbol in symbols}
+    if fill_from_order_book:
+        books = DepthFeed(symbols).start().books
+        for symbol, state in states.items():
+            state.ledger.book = books[symbol]
+    print(f"Subscribing to {len(symbols)} symbols with interval {interval}")
+    try:
+        asyncio.run(subscribe(states, interval, on_update=print_closed_candle))
+    except KeyboardInterrupt:
+        print('Interrupt received, stopping…')
+    print_summary(states)
@@ -0,0 +1,255 @@
+import argparse
+import asyncio
+import json
+import threading
+import urllib.parse
+import urllib.request
+from bisect import bisect_left
+
+import websockets
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # orjson is optional, the json module is used instead
+    _loads = json.loads
+
+STREAM_URL = "wss://stream.binancefuture.com"
+# Depth snapshot endpoint of the futures testnet the live scripts stream from.
+DEPTH_URL = "https://testnet.binancefuture.com/fapi/v1/depth"
+
+
+class BookSide:
+    """One side of an L2 book as a sorted array of price keys with a parallel array of quantities.
+
+    Bids are stored under the negated price so both sides iterate best level first.
+    Finding a level is a binary search; inserting or removing one shifts the arrays
+    with a single memmove.
+    """
+
+    def __init__(self, descending):
+        self.sign = -1.0 if descending else 1.0
+        self.keys = []
+        self.quantities = []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def clear(self):
+        self.keys.clear()
+        self.quantities.clear()
+
+    def set(self, price, quantity):
+        """Sets the quantity at price; quantity 0 removes the level."""
+        key = self.sign * price
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            if quantity:
+                self.quantities[i] = quantity
+            else:
+                del self.keys[i]
+                del self.quantities[i]
+        elif quantity:
+            self.keys.insert(i, key)
+            self.quantities.insert(i, quantity)
+
+    def best(self):
+        return self.sign * self.keys[0] if self.keys else None
+
+    def levels(self):
+        """(price, quantity) pairs, best first."""
+        return [(self.sign * key, quantity) for key, quantity in zip(self.keys, self.quantities)]
+
+    def walk(self, quantity=None, quote=None, scale=1.0):
+        """Takes liquidity best level first until quantity (base) or quote (price * quantity) is filled.
+
+        Returns (filled quantity, quote amount). Prices are multiplied by scale. What the
+        book cannot fill is filled at its worst price.
+        """
+        filled = spent = 0.0
+        price = None
+        for key, available in zip(self.keys, self.quantities):
+            price = self.sign * key * scale
+            if quantity is not None:
+                take = min(available, quantity - filled)
+            else:
+                take = min(available, (quote - spent) / price)
+            filled += take
+            spent += take * price
+            if (quantity is not None and filled >= quantity) or (quote is not None and spent >= quote):
+                return filled, spent
+        if price is not None:
+            remaining = (quantity - filled) if quantity is not None else (quote - spent) / price
+            filled += remaining
+            spent += remaining * price
+        return filled, spent
+
+
+class OrderBook:
+    """Local L2 order book kept in sync with a Binance futures depth diff stream.
+
+    Follows the documented procedure: diffs are buffered until a REST snapshot arrives,
+    diffs older than the snapshot are skipped, and every following diff must continue
+    the previous one ('pu' equals the last 'u'), otherwise the book asks for a new
+    snapshot.
+    """
+
+    def __init__(self, symbol):
+        self.symbol = symbol.upper()
+        self.bids = BookSide(descending=True)
+        self.asks = BookSide(descending=False)
+        self.last_update_id = None
+        self.synced = False
+        self.updates = 0
+        self.lock = threading.Lock()
+
+    def apply_snapshot(self, snapshot):
+        """Replaces the book with a REST depth snapshot {'lastUpdateId', 'bids', 'asks'}."""
+        with self.lock:
+            self.bids.clear()
+            self.asks.clear()
+            for price, quantity in snapshot['bids']:
+                self.bids.set(float(price), float(quantity))
+            for price, quantity in snapshot['asks']:
+                self.asks.set(float(price), float(quantity))
+            self.last_update_id = snapshot['lastUpdateId']
+            self.synced = False  # Until a diff spanning lastUpdateId has been applied
+
+    def apply_diff(self, event):
+        """Applies one depth diff event; returns False if the book is out of sync and needs a new snapshot."""
+        if self.last_update_id is None:
+            return False
+        if event['u'] < self.last_update_id:
+            return True  # Already contained in the snapshot
+        if self.synced:
+            if event['pu'] != self.last_update_id:
+                return False
+        elif event['U'] > self.last_update_id:
+            return False  # The snapshot is older than the first buffered diff
+        with self.lock:
+            for price, quantity in event['b']:
+                self.bids.set(float(price), float(quantity))
+            for price, quantity in event['a']:
+                self.asks.set(float(price), float(quantity))
+            self.last_update_id = event['u']
+            self.synced = True
+            self.updates += 1
+        return True
+
+    def mid(self):
+        bid, ask = self.bids.best(), self.asks.best()
+        if bid is None or ask is None:
+            return None
+        return (bid + ask) / 2
+
+    def average_price(self, side, quantity=None, quote=None, reference=None):
+        """Average fill price of a market order walking the book.
+
+        side 1 buys from the asks, -1 sells into the bids; the size is a base quantity
+        or a quote amount. With reference the book is used as a liquidity profile around
+        that price instead: every level is scaled by reference / mid, e.g. to apply a
+        recorded book to historical closes. Returns None for an empty book.
+        """
+        with self.lock:
+            book_side = self.asks if side == 1 else self.bids
+            if not len(book_side):
+                return None
+            scale = 1.0
+            if reference is not None:
+                mid = self.mid() or book_side.best()
+                scale = reference / mid
+            filled, spent = book_side.walk(quantity, quote, scale)
+        return spent / filled if filled else None
+
+
+def decode_depth(frame):
+    """Decodes a plain or combined-stream depth diff frame into its event dict."""
+    event = _loads(frame)
+    return event.get('data', event)
+
+
+def fetch_snapshot(symbol, url=DEPTH_URL, limit=1000, timeout=10):
+    query = urllib.parse.urlencode({'symbol': symbol.upper(), 'limit': limit})
+    with urllib.request.urlopen(f"{url}?{query}", timeout=timeout) as response:
+        return json.load(response)
+
+
+def load_snapshot(path, symbol="BTCUSDT"):
+    """Builds an OrderBook from a depth snapshot saved as JSON, e.g. by this module's CLI."""
+    with open(path) as saved:
+        snapshot = json.load(saved)
+    book = OrderBook(symbol)
+    book.apply_snapshot(snapshot)
+    return book
+
+
+class DepthFeed:
+    """Keeps an OrderBook per symbol up to date from one combined @depth stream on a background thread."""
+
+    def __init__(self, symbols, stream_url=STREAM_URL, snapshot_url=DEPTH_URL, speed='100ms', snapshot_limit=1000):
+        self.books = {symbol.upper(): OrderBook(symbol) for symbol in symbols}
+        self.stream_url = stream_url
+        self.snapshot_url = snapshot_url
+        self.speed = speed
+        self.snapshot_limit = snapshot_limit
+        self.resyncs = 0
+        self._pending = {}  # symbol -> diffs buffered while its snapshot is being fetched
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._run()), name="depth-feed", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def url(self):
+        streams = '/'.join(f"{symbol.lower()}@depth@{self.speed}" for symbol in self.books)
+        return f"{self.stream_url}/stream?streams={streams}"
+
+    async def _resync(self, book):
+        try:
+            snapshot = await asyncio.to_thread(fetch_snapshot, book.symbol, self.snapshot_url, self.snapshot_limit)
+        except (OSError, ValueError) as error:
+            print(f"Depth snapshot for {book.symbol} failed: {error}")
+            del self._pending[book.symbol]  # The next diff asks for a snapshot again
+            return
+        book.apply_snapshot(snapshot)
+        for event in self._pending.pop(book.symbol):
+            if not book.apply_diff(event):
+                break
+        self.resyncs += 1
+
+    def on_event(self, event):
+        """Applies one decoded diff, buffering it and fetching a snapshot when the book is not in sync."""
+        book = self.books.get(event['s'])
+        if book is None:
+            return
+        pending = self._pending.get(book.symbol)
+        if pending is not None:
+            pending.append(event)
+        elif not book.apply_diff(event):
+            self._pending[book.symbol] = [event]
+            asyncio.get_running_loop().create_task(self._resync(book))
+
+    async def _run(self, reconnect_delay=1.0):
+        while True:
+            try:
+                async with websockets.connect(self.url(), max_size=None) as ws:
+                    for book in self.books.values():
+                        book.last_update_id = None  # Force a fresh snapshot after every (re)connect
+                    async for message in ws:
+                        self.on_event(decode_depth(message))
+            except (OSError, websockets.ConnectionClosed) as error:
+                print(f"Depth stream: {error}")
+            await asyncio.sleep(reconnect_delay)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Saves a depth snapshot for slippage-aware backtests.")
+    parser.add_argument("symbol")
+    parser.add_argument("output")
+    parser.add_argument("--url", default=DEPTH_URL)
+    parser.add_argument("--limit", type=int, default=1000)
+    args = parser.parse_args()
+
+    with open(args.output, 'w') as output:
+        json.dump(fetch_snapshot(args.symbol, args.url, args.limit), output)
+    print(f"Saved the {args.symbol} order book to {args.output}")
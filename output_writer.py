@@ -0,0 +1,107 @@
+import math
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+
+OUTPUT_MODES = ('every', 'closed', 'rate')
+
+
+def format_value(value):
+    """Plain text for one cell: shortest round-trip repr for floats, NaN like pandas prints it."""
+    if isinstance(value, np.float32):  # Shortest repr of the float32 value, not of its float64 widening
+        return 'NaN' if np.isnan(value) else str(value)
+    if hasattr(value, 'item'):  # NumPy scalar from the candle store
+        value = value.item()
+    if isinstance(value, float):
+        return 'NaN' if math.isnan(value) else repr(value)
+    return str(value)
+
+
+class OutputWriter:
+    """Prints candle rows from a background thread so the websocket callback never waits on stdout.
+
+    write() only puts the row on a bounded queue; when the queue is full the row is
+    dropped and counted instead of blocking. Rows are rendered as plain fixed-width
+    text without pandas, with the header repeated whenever the columns change.
+
+    mode='every' prints every update, 'closed' only updates that close a candle and
+    'rate' at most max_lines_per_sec lines per second, always the newest row.
+    """
+
+    def __init__(self, mode='every', max_lines_per_sec=None, queue_size=10_000, stream=None, width=13):
+        if mode not in OUTPUT_MODES:
+            raise ValueError(f"Unknown output mode {mode!r}, expected one of {OUTPUT_MODES}")
+        if mode == 'rate' and not max_lines_per_sec:
+            raise ValueError("mode='rate' requires max_lines_per_sec")
+        self.mode = mode
+        self.max_lines_per_sec = max_lines_per_sec
+        self.stream = stream
+        self.width = width
+        self.dropped = 0
+        self.lines_written = 0
+        self._columns = None
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="output-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, row, closed=True):
+        """Queues row (a dict of column -> value) for printing; closed tells whether it finalized its candle."""
+        if self.mode == 'closed' and not closed:
+            return
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """Prints the rows still queued and stops the writer thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def render(self, row):
+        """Formats row as one line, preceded by a header line if its columns differ from the previous row's."""
+        line = ' '.join(format_value(value).rjust(self.width) for value in row.values())
+        if list(row) != self._columns:
+            self._columns = list(row)
+            header = ' '.join(str(column).rjust(self.width) for column in self._columns)
+            return f"{header}\n{line}\n"
+        return line + "\n"
+
+    def _drain(self, rows):
+        """Moves everything queued into rows without waiting; returns False once close() was called."""
+        while True:
+            try:
+                row = self._queue.get_nowait()
+            except queue.Empty:
+                return True
+            if row is None:
+                return False
+            rows.append(row)
+
+    def _run(self):
+        interval = 1.0 / self.max_lines_per_sec if self.mode == 'rate' else 0.0
+        next_line = 0.0
+        running = True
+        while running:
+            row = self._queue.get()
+            if row is None:
+                break
+            rows = [row]
+            if interval:
+                # Wait for the next slot, then print only the newest of the rows that arrived meanwhile.
+                delay = next_line - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                running = self._drain(rows)
+                self.dropped += len(rows) - 1
+                rows = rows[-1:]
+                next_line = time.monotonic() + interval
+            else:
+                running = self._drain(rows)
+            stream = self.stream or sys.stdout
+            stream.write(''.join(self.render(row) for row in rows))
+            stream.flush()
+            self.lines_written += len(rows)
@@ -0,0 +1,119 @@
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+import simulated_trading_bot as bot
+from indicators import RollingMean
+
+PERIODS = [1, 2, 5, 10, 13, 48]
+
+
+def reference_moving_average(values, period, decimals=3):
+    """The pandas moving average the live scripts computed before the rolling means."""
+    return pd.Series(values).rolling(window=period, min_periods=period).mean().round(decimals).to_numpy()
+
+
+def legacy_trade(dataFrame, startingCapital):
+    """The iterrows Trade() of simulated_trading_bot before it moved to runBacktest; returns portfolio_value."""
+    cash = startingCapital
+    stock = 0
+    dataFrame = dataFrame.copy()
+    dataFrame["portfolio_value"] = startingCapital
+
+    for index, row in dataFrame.iterrows():
+        if row["position"] == 1:  # Buy signal
+            if cash > 0:
+                stock = cash / row["c"]
+                cash = 0
+        elif row["position"] == -1:  # Sell signal
+            if stock > 0:
+                cash = stock * row["c"]
+                stock = 0
+        dataFrame.at[index, "portfolio_value"] = cash + stock * row["c"]
+    return dataFrame["portfolio_value"].to_numpy()
+
+
+def price_series(rows, seed=0):
+    """Named close series covering the special cases of the pandas rolling mean."""
+    rng = np.random.default_rng(seed)
+    walk = np.round(30000 + np.cumsum(rng.normal(0, 5, rows)), 2)
+    # Runs of one repeated value, e.g. a quiet market printing the same close.
+    runs = np.repeat(np.round(30000 + rng.normal(0, 50, rows // 20 + 1), 2), 20)[:rows]
+    constant = np.full(rows, 30123.45)
+    negative = np.round(rng.normal(-100, 10, rows), 2)
+    # Crossing zero exercises the all-negative and all-positive clamps.
+    around_zero = np.round(np.cumsum(rng.normal(0, 0.5, rows)), 3)
+    mixed = np.where(rng.random(rows) < 0.1, 0.0, np.round(rng.normal(0, 1e4, rows), 2))
+    # Tiny values between huge spikes: once a spike leaves the window the running sum is left with
+    # rounding error, which the compensation and the sign clamps of pandas have to cancel.
+    spikes = np.round(rng.random(rows) * 1e-6, 8)
+    is_spike = rng.random(rows) < 0.05
+    spikes[is_spike] = 1e15 * rng.random(is_spike.sum())
+    return {'random walk': walk, 'constant runs': runs, 'constant': constant, 'negative': negative,
+            'around zero': around_zero, 'mixed magnitudes': mixed, 'spikes': spikes, 'negative spikes': -spikes}
+
+
+def _same(actual, expected):
+    """Elementwise equality that tells 0.0 from -0.0 and treats NaN as equal to NaN."""
+    return (((actual == expected) & (np.signbit(actual) == np.signbit(expected)))
+            | (np.isnan(actual) & np.isnan(expected)))
+
+
+def check_rolling_mean(rows):
+    """Compares RollingMean with the pandas moving average on every series and period; returns the failures."""
+    failures = []
+    for name, values in price_series(rows).items():
+        for period in PERIODS:
+            average = RollingMean(period)
+            incremental = np.empty(len(values))
+            for i, value in enumerate(values):
+                peeked = average.peek(value)
+                incremental[i] = average.update(value)
+                if not _same(peeked, incremental[i]):
+                    failures.append(f"RollingMean({period}).peek differs from update on {name} at row {i}")
+                    break
+            expected = reference_moving_average(values, period)
+            mismatch = np.flatnonzero(~_same(incremental, expected))
+            if len(mismatch):
+                i = mismatch[0]
+                failures.append(f"RollingMean({period}) on {name}: {len(mismatch)} rows differ, "
+                                f"first at row {i}: {incremental[i]!r} != {expected[i]!r}")
+    return failures
+
+
+def check_backtest(rows):
+    """Compares runBacktest with the legacy iterrows Trade on crossover signals; returns the failures."""
+    failures = []
+    for name, values in price_series(rows).items():
+        if (values <= 0).any():
+            continue  # Trade() divides by the close
+        data = pd.DataFrame({'c': values})
+        bot.calculateMovingAverages(data, 5, 20)
+        bot.identifySignals(data)
+        expected = legacy_trade(data, 10000.0)
+        result = bot.runBacktest(data["c"].to_numpy(), data["position"].to_numpy(), 10000.0)
+        if not _same(result.portfolio_value, expected).all():
+            i = np.flatnonzero(~_same(result.portfolio_value, expected))[0]
+            failures.append(f"runBacktest on {name}: first difference at row {i}: "
+                            f"{result.portfolio_value[i]!r} != {expected[i]!r}")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Checks the incremental indicators and the vectorized backtest "
+                                                 "against the pandas and iterrows versions they replaced.")
+    parser.add_argument("--rows", type=int, default=5_000)
+    args = parser.parse_args()
+
+    failures = []
+    for name, check in [('RollingMean vs rolling().mean()', check_rolling_mean),
+                        ('runBacktest vs iterrows Trade', check_backtest)]:
+        found = check(args.rows)
+        print(f"{'FAIL' if found else 'OK  '} {name}")
+        for failure in found:
+            print(f"     {failure}")
+        failures += found
+    print(f"pandas {pd.__version__}, numpy {np.__version__}")
+    sys.exit(1 if failures else 0)
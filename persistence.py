@@ -0,0 +1,128 @@
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # without pyarrow the partitions are written as CSV files
+    pyarrow = None
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+class CandlePersister:
+    """Appends closed candles to per-symbol, per-day files from a background thread.
+
+    The hot path only copies the newly closed rows out of the candle store and queues
+    them. The writer thread flushes once flush_rows rows are pending or every
+    flush_interval seconds, so a crash loses at most one interval and shutdown only
+    writes the tail. Files go to ``root/SYMBOL/YYYY-MM-DD/`` as one Parquet part per
+    flush, or appended to ``root/SYMBOL/YYYY-MM-DD.csv`` when pyarrow is missing.
+    Every flush is also appended to history, a HistoryStore, when one is given.
+    """
+
+    def __init__(self, root, symbol, flush_interval=60.0, flush_rows=1000, file_format=None, history=None):
+        self.root = root
+        self.symbol = symbol.upper()
+        self.flush_interval = flush_interval
+        self.flush_rows = flush_rows
+        self.file_format = file_format or ('parquet' if pyarrow else 'csv')
+        if self.file_format == 'parquet' and pyarrow is None:
+            raise ValueError("file_format='parquet' requires pyarrow")
+        self.history = history
+        self.position = 0  # Lifetime position in the candle store of the next row to persist
+        self.rows_written = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"persist-{self.symbol}", daemon=True)
+        self._thread.start()
+
+    def collect(self, candles, last_closed=True):
+        """Queues the rows of candles that are final and not yet persisted.
+
+        The newest row is held back while it is still forming (last_closed False).
+        """
+        stop = candles.appended if last_closed else candles.appended - 1
+        if stop <= self.position:
+            return
+        rows = candles.rows_since(self.position, stop)
+        self.position = stop
+        if len(rows['timestamp']):
+            self._queue.put(rows)
+
+    def close(self):
+        """Writes the rows still pending and stops the writer thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        pending = []
+        pending_rows = 0
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                rows = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                rows = False
+            stopping = rows is None
+            if rows:
+                pending.append(rows)
+                pending_rows += len(rows['timestamp'])
+            if stopping or pending_rows >= self.flush_rows or time.monotonic() >= deadline:
+                if pending:
+                    try:
+                        self._write(pending)
+                    except (OSError, ValueError) as error:
+                        # Keep the rows and try again at the next flush.
+                        print(f"Could not persist {pending_rows} {self.symbol} rows: {error}")
+                    else:
+                        self.rows_written += pending_rows
+                        pending, pending_rows = [], 0
+                deadline = time.monotonic() + self.flush_interval
+            if stopping:
+                return
+
+    def _write(self, pending):
+        frame = pd.DataFrame({name: np.concatenate([rows[name] for rows in pending]) for name in pending[0]})
+        days = frame['timestamp'].to_numpy() // DAY_MS
+        for day in np.unique(days):
+            part = frame[days == day]
+            date = time.strftime('%Y-%m-%d', time.gmtime(int(day) * DAY_MS / 1000))
+            if self.file_format == 'parquet':
+                directory = os.path.join(self.root, self.symbol, date)
+                os.makedirs(directory, exist_ok=True)
+                timestamps = part['timestamp']
+                # Naming the part by its first and last candle makes rewriting the same rows idempotent.
+                path = os.path.join(directory, f"part-{timestamps.iloc[0]}-{timestamps.iloc[-1]}.parquet")
+                temp_path = path + '.tmp'
+                pyarrow.parquet.write_table(pyarrow.Table.from_pandas(part, preserve_index=False), temp_path)
+                os.replace(temp_path, path)
+            else:
+                directory = os.path.join(self.root, self.symbol)
+                os.makedirs(directory, exist_ok=True)
+                path = os.path.join(directory, f"{date}.csv")
+                part.to_csv(path, mode='a', index=False, header=not os.path.exists(path))
+        if self.history is not None:
+            self.history.append({name: frame[name].to_numpy() for name in frame})
+
+
+def read_history(root, symbol, date=None):
+    """Reads back the persisted candles of a symbol, optionally for one 'YYYY-MM-DD' day."""
+    directory = os.path.join(root, symbol.upper())
+    frames = []
+    for name in sorted(os.listdir(directory)):
+        if date is not None and not name.startswith(date):
+            continue
+        path = os.path.join(directory, name)
+        if os.path.isdir(path):
+            frames.extend(pd.read_parquet(os.path.join(path, part))
+                          for part in sorted(os.listdir(path)) if part.endswith('.parquet'))
+        elif name.endswith('.csv'):
+            frames.append(pd.read_csv(path))
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True).sort_values('timestamp', kind='stable', ignore_index=True)
@@ -0,0 +1,179 @@
+import collections
+import contextlib
+import re
+import threading
+import traceback
+
+from kline_decoder import decode_kline
+
+BACKPRESSURE_POLICIES = ('block', 'drop_oldest', 'coalesce')
+# Symbol, open time, interval and closed flag of a raw kline frame, in the field order Binance sends.
+_KLINE_FIELDS = re.compile(rb'"s":\s*"([^"]*)".*?"t":\s*(\d+).*?"i":\s*"([^"]*)".*?"x":\s*(true|false)')
+
+
+def decode_klines(frames):
+    """Decodes every frame of a batch as one kline event."""
+    return [decode_kline(frame) for frame in frames]
+
+
+def _peek_kline(frame):
+    """((symbol, open time, interval), closed) of a raw kline frame without decoding it, or None for other frames."""
+    match = _KLINE_FIELDS.search(frame.encode() if isinstance(frame, str) else frame)
+    if match is None:
+        return None
+    symbol, open_time, interval, closed = match.groups()
+    return (symbol, open_time, interval), closed == b'true'
+
+
+class FramePipeline:
+    """Moves decoding and strategy work off the websocket receive thread.
+
+    put() only appends the raw frame to a bounded queue. A worker thread drains the
+    queue in batches of up to batch_size frames, decodes them and calls
+    on_kline(kline) for each. decode turns a batch of frames into Klines; by default
+    every frame is a kline event, TradeBarBuilder.decode instead builds bars from
+    trade frames. When the queue is full the policy decides:
+
+    'block'        the receive thread waits for room, nothing is lost;
+    'drop_oldest'  the oldest queued frame is discarded;
+    'coalesce'     an older queued update of the same forming candle as the new frame
+                   is discarded, the oldest frame only if there is none; and within
+                   each batch only the newest update of a forming candle is handed on,
+                   so a worker that falls behind skips intermediate ticks instead of
+                   replaying them. Updates that close a candle are kept as long as the
+                   queue holds superseded ones to drop instead.
+
+    A frame that fails to decode, or whose on_kline raises, is reported and skipped on
+    its own: when decode fails for a batch its frames are decoded one by one, and every
+    on_kline call is guarded separately, so the rest of the batch is still handled.
+
+    With a Metrics instance the queue depth, its high-water mark, dropped and coalesced
+    frames, decode and on_kline failures and the size of each batch are reported.
+    """
+
+    def __init__(self, on_kline, policy='block', max_size=10_000, batch_size=500, metrics=None, decode=decode_klines):
+        if policy not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Unknown backpressure policy {policy!r}, expected one of {BACKPRESSURE_POLICIES}")
+        self.on_kline = on_kline
+        self.decode = decode
+        self.policy = policy
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.metrics = metrics
+        self.dropped = 0
+        self.coalesced = 0
+        self.decode_errors = 0
+        self.kline_errors = 0
+        self.max_depth = 0
+        self._frames = collections.deque()
+        self._busy = False  # Whether the worker is handling a batch taken off the queue
+        self._closing = False
+        self._condition = threading.Condition()
+        if metrics is not None:
+            metrics.gauge('queue_depth', lambda: len(self._frames))
+            metrics.gauge('queue_max_depth', lambda: self.max_depth)
+            metrics.counter('queue_drops', lambda: self.dropped)
+            metrics.counter('queue_coalesced', lambda: self.coalesced)
+            metrics.counter('decode_errors', lambda: self.decode_errors)
+            metrics.counter('kline_errors', lambda: self.kline_errors)
+        self._thread = threading.Thread(target=self._run, name="pipeline-worker", daemon=True)
+        self._thread.start()
+
+    def __len__(self):
+        return len(self._frames)
+
+    def put(self, frame):
+        """Queues one raw frame; called from the receive thread."""
+        with self._condition:
+            if len(self._frames) >= self.max_size:
+                if self.policy == 'block':
+                    self._condition.wait_for(lambda: len(self._frames) < self.max_size or self._closing)
+                elif self.policy == 'coalesce' and self._evict_superseded(frame):
+                    self.coalesced += 1
+                else:
+                    self._frames.popleft()
+                    self.dropped += 1
+            self._frames.append(frame)
+            if len(self._frames) > self.max_depth:
+                self.max_depth = len(self._frames)
+            self._condition.notify_all()
+
+    def _evict_superseded(self, frame):
+        """Removes the oldest queued forming update of frame's candle; returns False if there is none."""
+        peeked = _peek_kline(frame)
+        if peeked is None:
+            return False
+        key = peeked[0]
+        for i, queued in enumerate(self._frames):
+            if _peek_kline(queued) == (key, False):
+                del self._frames[i]
+                return True
+        return False
+
+    def join(self):
+        """Waits until every queued frame has been handled."""
+        with self._condition:
+            self._condition.wait_for(lambda: not self._frames and not self._busy)
+
+    def close(self):
+        """Handles the frames still queued and stops the worker thread."""
+        with self._condition:
+            self._closing = True
+            self._condition.notify_all()
+        self._thread.join()
+
+    def _take_batch(self):
+        with self._condition:
+            self._condition.wait_for(lambda: self._frames or self._closing)
+            count = min(len(self._frames), self.batch_size)
+            batch = [self._frames.popleft() for _ in range(count)]
+            self._busy = bool(batch)
+            self._condition.notify_all()  # Room for a blocked put()
+            return batch
+
+    def _coalesce(self, klines):
+        """Keeps closing updates and the newest update of each forming candle, in arrival order."""
+        newest = {(kline.symbol, kline.interval, kline.open_time): i for i, kline in enumerate(klines)}
+        kept = [kline for i, kline in enumerate(klines)
+                if kline.closed or newest[(kline.symbol, kline.interval, kline.open_time)] == i]
+        self.coalesced += len(klines) - len(kept)
+        return kept
+
+    def _decode(self, batch):
+        try:
+            return self.decode(batch)
+        except Exception:
+            if len(batch) == 1:
+                self.decode_errors += 1
+                traceback.print_exc()
+                return []
+        # Retry frame by frame so only the frames that fail are lost.
+        klines = []
+        for frame in batch:
+            klines.extend(self._decode([frame]))
+        return klines
+
+    def _run(self):
+        time_decode = self.metrics.time('decode') if self.metrics is not None else contextlib.nullcontext()
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return  # Closing and nothing left
+            if self.metrics is not None:
+                self.metrics.count('batches')
+            try:
+                with time_decode:
+                    klines = self._decode(batch)
+                if self.policy == 'coalesce':
+                    klines = self._coalesce(klines)
+                for kline in klines:
+                    try:
+                        self.on_kline(kline)
+                    except Exception:
+                        # Keep consuming; a bad update must not stop the bot or cost the rest of the batch.
+                        self.kline_errors += 1
+                        traceback.print_exc()
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
@@ -0,0 +1,158 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+import websockets
+
+from kline_decoder import synthetic_frames
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+# Lines the live scripts print for a stored row start with the candle's epoch-ms open time.
+ROW_LINE = re.compile(rb"^\s*\d{13}\s")
+
+
+def load_frames(path):
+    """Reads recorded frames, one raw JSON message per line."""
+    with open(path, 'rb') as recording:
+        return [line.rstrip(b'\r\n') for line in recording if line.strip()]
+
+
+async def record(url, path, count):
+    """Records count raw frames from a live stream into path."""
+    async with websockets.connect(url) as ws:
+        with open(path, 'wb') as recording:
+            for _ in range(count):
+                message = await ws.recv()
+                recording.write((message.encode() if isinstance(message, str) else message) + b'\n')
+
+
+def _event_time(frame):
+    return json.loads(frame).get('E')
+
+
+class ReplayServer:
+    """Local websocket server that plays frames to every client that connects.
+
+    speed=1 replays at the pace of the frames' event times ('E'), speed=N N times
+    faster and speed=0 as fast as possible. The send time of every frame is kept so
+    the harness can measure end-to-end latency.
+    """
+
+    def __init__(self, frames, speed=0.0, host='127.0.0.1', port=8765):
+        self.frames = frames
+        self.speed = speed
+        self.host = host
+        self.port = port
+        self.send_times = []
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}/ws"
+
+    async def handler(self, ws):
+        self.send_times = []
+        first_event = _event_time(self.frames[0]) if self.speed and self.frames else None
+        start = time.perf_counter()
+        for frame in self.frames:
+            if first_event is not None:
+                # Wait until the frame is due relative to the first one.
+                due = start + (_event_time(frame) - first_event) / 1000 / self.speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            self.send_times.append(time.perf_counter())
+            await ws.send(frame.decode() if isinstance(frame, bytes) else frame)
+
+    async def serve_forever(self):
+        async with websockets.serve(self.handler, self.host, self.port, max_size=None):
+            print(f"Replaying {len(self.frames)} frames on {self.url}")
+            await asyncio.Future()
+
+
+async def run_script(script, server, idle_timeout=5.0):
+    """Runs one live script against the replay server and returns its throughput and latency."""
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ, BINANCE_STREAM_URL=server.url, BINANCE_DATA_DIR=os.path.join(workdir, 'data'),
+                   BINANCE_BACKFILL=os.environ.get("BINANCE_BACKFILL", ""))
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, '-u', os.path.join(SCRIPT_DIR, script),
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT, cwd=workdir, env=env,
+        )
+        receive_times = []
+        try:
+            while len(receive_times) < len(server.frames):
+                line = await asyncio.wait_for(process.stdout.readline(), idle_timeout)
+                if not line:
+                    break
+                if ROW_LINE.match(line):
+                    receive_times.append(time.perf_counter())
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            if process.returncode is None:
+                process.terminate()
+            await process.wait()
+
+    handled = min(len(receive_times), len(server.send_times))
+    if not handled:
+        return {'script': script, 'messages': 0}
+    latencies = sorted(receive_times[i] - server.send_times[i] for i in range(handled))
+    elapsed = receive_times[handled - 1] - server.send_times[0]
+    return {
+        'script': script,
+        'messages': handled,
+        'messages_per_sec': handled / elapsed if elapsed > 0 else float('inf'),
+        'latency_p50_ms': statistics.median(latencies) * 1000,
+        'latency_p99_ms': latencies[min(handled - 1, int(handled * 0.99))] * 1000,
+        'latency_max_ms': latencies[-1] * 1000,
+    }
+
+
+async def benchmark(scripts, frames, speed, port):
+    server = ReplayServer(frames, speed, port=port)
+    results = []
+    async with websockets.serve(server.handler, server.host, server.port, max_size=None):
+        for script in scripts:
+            results.append(await run_script(script, server))
+    return results
+
+
+def print_results(results):
+    print(f"{'script':<22} {'messages':>9} {'msg/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for result in results:
+        if not result['messages']:
+            print(f"{result['script']:<22} {0:>9} (no rows printed)")
+            continue
+        print(f"{result['script']:<22} {result['messages']:>9} {result['messages_per_sec']:>10.0f} "
+              f"{result['latency_p50_ms']:>9.2f} {result['latency_p99_ms']:>9.2f} {result['latency_max_ms']:>9.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replays kline frames to the live scripts over a local websocket.")
+    parser.add_argument("--file", help="recorded frames, one JSON message per line (synthetic frames if omitted)")
+    parser.add_argument("--count", type=int, default=5000, help="number of synthetic frames / frames to record")
+    parser.add_argument("--speed", type=float, default=0.0, help="1 = real time, N = N times faster, 0 = flat out")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--serve", action="store_true", help="only run the server")
+    parser.add_argument("--record", metavar="URL", help="record --count frames from URL into --file")
+    parser.add_argument("scripts", nargs="*", default=[f"binance_ohlcv_v{i}.py" for i in range(1, 6)])
+    args = parser.parse_args()
+
+    if args.record:
+        asyncio.run(record(args.record, args.file, args.count))
+        sys.exit(0)
+
+    frames = load_frames(args.file) if args.file else synthetic_frames(args.count)
+    if args.serve:
+        try:
+            asyncio.run(ReplayServer(frames, args.speed, port=args.port).serve_forever())
+        except KeyboardInterrupt:
+            pass
+    else:
+        print_results(asyncio.run(benchmark(args.scripts, frames, args.speed, args.port)))
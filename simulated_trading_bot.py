@@ -10,6 +10,9 @@
 # Notes          : Requires pandas and numpy. Assumes data in 'csv' format with 'datetime' and 'c' columns.
 # Usage          : See below
 #                  python simulated_trading_bot_.py your_data_file.csv
+#                  python simulated_trading_bot_.py your_data_file.csv --sweep --short 5:30:1 --long 20:200:5
+#                  python simulated_trading_bot_.py your_data_file.csv --book btcusdt_depth.json
+#                  python simulated_trading_bot_.py history_root --symbol BTCUSDT --interval 1m --start 2024-03-01 --end 2024-04-01
 # ====================================================================
 
 import pandas as pd
@@ -17,22 +20,167 @@ import numpy as np
 import sys
 import datetime
 import os
+import argparse
+import functools
+from collections import namedtuple
+from multiprocessing import Pool, shared_memory
+
+from candle_schema import apply_schema, csv_dtypes, memory_report, to_epoch_ms
+
+try:
+    import pyarrow  # optional: faster CSV parsing and Parquet cache files
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Column types of the price files, so pandas does not have to infer them.
+# They come from the candle schema shared with the live scripts.
+CSV_DTYPES = csv_dtypes()
+
+# Result of a backtest run: equity curve and cash/stock state per row, plus one entry per executed fill.
+BacktestResult = namedtuple(
+    "BacktestResult",
+    ["portfolio_value", "cash", "stock", "fill_index", "fill_side", "fill_price", "fill_quantity"],
+)
 
 # --------------------------------------------------------------------
 # Reads historical price data from a CSV file
+# Only the given columns are read (all when None). The result is cached in
+# a binary sidecar next to the CSV (Parquet with pyarrow, .npz otherwise)
+# which later runs load instead of parsing the CSV again. The cache always
+# holds float64 prices, narrowed to priceDtype after loading. The frame
+# follows the candle schema: an int64 epoch-ms 'timestamp' next to
+# 'datetime' and prices in priceDtype.
 # def getHistoricalData(filePath):
 # --------------------------------------------------------------------
-def getData(filePath):
+def getData(filePath, columns=None, useCache=True, priceDtype="float64"):
     if not os.path.exists(filePath):
         print(f"[ERROR] : File '{filePath}' does not exist.")
         sys.exit(1)
     else:
         print(f"[OK   ] : File '{filePath}' exist.")
 
-    df = pd.read_csv(filePath)
-    df["datetime"] = pd.to_datetime(df["datetime"])
+    cachePath = getCachePath(filePath)
+    if useCache:
+        df = readCache(filePath, cachePath, columns)
+        if df is not None:
+            print(f"[OK   ] : Loaded cache '{cachePath}'.")
+            return apply_schema(df, priceDtype)
+
+    df = pd.read_csv(filePath, usecols=columns, dtype=CSV_DTYPES, engine="pyarrow" if pyarrow else "c")
+    if "datetime" in df:
+        df["datetime"] = parseDatetime(df["datetime"])
+    apply_schema(df)
+    if useCache:
+        writeCache(df, cachePath)
+    return apply_schema(df, priceDtype)
+
+# --------------------------------------------------------------------
+
+
+# --------------------------------------------------------------------
+# Reads a date window from a history store (see history_store.py)
+# The window is found by binary search over the memory-mapped timestamp
+# column, so only the rows of [start, end) are read from disk.
+# def getStoreData(storeRoot, symbol, interval, start, end, columns, priceDtype):
+# --------------------------------------------------------------------
+def getStoreData(storeRoot, symbol, interval, start=None, end=None, columns=None, priceDtype="float64"):
+    from history_store import HistoryStore
+
+    store = HistoryStore(storeRoot, symbol, interval)
+    if not len(store):
+        print(f"[ERROR] : No {symbol} {interval} history in '{store.directory}'.")
+        sys.exit(1)
+    print(f"[OK   ] : History store '{store.directory}' has {len(store)} rows.")
+
+    window = store.slice(to_epoch_ms(start), to_epoch_ms(end),
+                         [column for column in columns or store.columns if column != "datetime"])
+    df = pd.DataFrame({column: np.array(values) for column, values in window.items()})
+    df.insert(1, "datetime", pd.to_datetime(df["timestamp"], unit="ms"))
+    return apply_schema(df, priceDtype)
+
+# --------------------------------------------------------------------
+
+
+# --------------------------------------------------------------------
+# Reads historical price data from a CSV file in chunks of chunkSize rows
+# def iterData(filePath, chunkSize, columns):
+# --------------------------------------------------------------------
+def iterData(filePath, chunkSize=1_000_000, columns=None, priceDtype="float64"):
+    for chunk in pd.read_csv(filePath, usecols=columns, dtype=csv_dtypes(price_dtype=priceDtype),
+                             chunksize=chunkSize):
+        if "datetime" in chunk:
+            chunk["datetime"] = parseDatetime(chunk["datetime"])
+        yield apply_schema(chunk, priceDtype)
+
+# --------------------------------------------------------------------
+
+
+# --------------------------------------------------------------------
+# Parses the datetime column, taking the fast path for ISO 8601 text
+# --------------------------------------------------------------------
+def parseDatetime(values):
+    try:
+        return pd.to_datetime(values, format="ISO8601")
+    except (ValueError, TypeError):
+        return pd.to_datetime(values)
+
+# --------------------------------------------------------------------
+
+
+# --------------------------------------------------------------------
+# Binary cache sidecar of a CSV file
+# --------------------------------------------------------------------
+def getCachePath(filePath):
+    return filePath + (".parquet" if pyarrow else ".npz")
+
+
+def readCache(filePath, cachePath, columns=None):
+    # The cache is only used if it is newer than the CSV and holds the requested columns
+    # in float64; a cache written with narrower prices cannot give them back.
+    if not os.path.exists(cachePath) or os.path.getmtime(cachePath) < os.path.getmtime(filePath):
+        return None
+    if columns is None:
+        columns = list(pd.read_csv(filePath, nrows=0).columns)
+
+    try:
+        if pyarrow:
+            if not set(columns) <= set(pyarrow.parquet.read_schema(cachePath).names):
+                return None
+            df = pd.read_parquet(cachePath, columns=columns)
+        else:
+            with np.load(cachePath, allow_pickle=False) as cache:
+                if not set(columns) <= set(cache["columns"]):
+                    return None
+                df = pd.DataFrame({name: cache[name] for name in columns})
+    except (OSError, ValueError) as error:
+        print(f"[WARN ] : Ignoring unreadable cache '{cachePath}': {error}")
+        return None
+    if any(df[name].dtype != CSV_DTYPES[name] for name in df.columns if name in CSV_DTYPES):
+        return None
     return df
 
+
+def cacheArray(column):
+    # np.load refuses pickled object arrays, so text and categorical columns are stored as fixed-width strings.
+    values = column.to_numpy()
+    return values.astype(str) if values.dtype == object else values
+
+
+def writeCache(df, cachePath):
+    # Write to a temporary file first so an interrupted run never leaves a broken cache behind.
+    tempPath = cachePath + ".tmp"
+    try:
+        if pyarrow:
+            df.to_parquet(tempPath, index=False)
+        else:
+            with open(tempPath, "wb") as cacheFile:
+                np.savez(cacheFile, columns=np.array(df.columns, dtype=str),
+                         **{name: cacheArray(df[name]) for name in df.columns})
+        os.replace(tempPath, cachePath)
+    except (OSError, ValueError, TypeError) as error:
+        print(f"[WARN ] : Could not write cache '{cachePath}': {error}")
+
 # --------------------------------------------------------------------
 
 
@@ -59,24 +207,74 @@ def identifySignals(dataFrame):
 
 
 # --------------------------------------------------------------------
-# Starts trading based on moving average crossover signals
-# def Trade(dataFrame, startingCapital):
+# Runs the all-in/all-out crossover strategy on NumPy arrays
+# With a book (an order_book.OrderBook, e.g. a saved depth snapshot) each
+# fill walks the book, scaled around the close, for the order size.
+# def runBacktest(close, position, startingCapital, book=None):
 # --------------------------------------------------------------------
-def Trade(dataFrame, startingCapital):
+def runBacktest(close, position, startingCapital, book=None):
+    close = np.asarray(close, dtype=float)
+    position = np.asarray(position, dtype=float)
+
+    # Only rows carrying a signal can change the state, so walk those and
+    # fill the rows in between in bulk.
+    signalIndex = np.flatnonzero((position == 1) | (position == -1))
     cash = startingCapital
     stock = 0
-    dataFrame["portfolio_value"] = startingCapital
-
-    for index, row in dataFrame.iterrows():
-        if row["position"] == 1:  # Buy signal
-            if cash > 0:
-                stock = cash / row["c"]
-                cash = 0
-        elif row["position"] == -1:  # Sell signal
-            if stock > 0:
-                cash = stock * row["c"]
-                stock = 0
-        dataFrame.at[index, "portfolio_value"] = cash + stock * row["c"]
+    cashStates = [cash]
+    stockStates = [stock]
+    fillIndex, fillSide, fillPrice, fillQuantity = [], [], [], []
+    for index in signalIndex:
+        price = close[index]
+        if position[index] == 1:  # Buy signal
+            if cash <= 0:
+                continue
+            if book is not None:
+                price = book.average_price(1, quote=cash, reference=price) or price
+            stock = cash / price
+            cash = 0
+            quantity = stock
+        else:  # Sell signal
+            if stock <= 0:
+                continue
+            quantity = stock
+            if book is not None:
+                price = book.average_price(-1, quantity=stock, reference=price) or price
+            cash = stock * price
+            stock = 0
+        cashStates.append(cash)
+        stockStates.append(stock)
+        fillIndex.append(index)
+        fillSide.append(int(position[index]))
+        fillPrice.append(price)
+        fillQuantity.append(quantity)
+
+    fillIndex = np.array(fillIndex, dtype=np.int64)
+    # State k holds after the k-th fill; every row uses the state of the last fill at or before it.
+    state = np.searchsorted(fillIndex, np.arange(len(close)), side="right")
+    cashCurve = np.array(cashStates, dtype=float)[state]
+    stockCurve = np.array(stockStates, dtype=float)[state]
+
+    return BacktestResult(
+        portfolio_value=cashCurve + stockCurve * close,
+        cash=cashCurve,
+        stock=stockCurve,
+        fill_index=fillIndex,
+        fill_side=np.array(fillSide, dtype=np.int8),
+        fill_price=np.array(fillPrice, dtype=float),
+        fill_quantity=np.array(fillQuantity, dtype=float),
+    )
+
+# --------------------------------------------------------------------
+
+
+# --------------------------------------------------------------------
+# Starts trading based on moving average crossover signals
+# def Trade(dataFrame, startingCapital, book=None):
+# --------------------------------------------------------------------
+def Trade(dataFrame, startingCapital, book=None):
+    result = runBacktest(dataFrame["c"].to_numpy(), dataFrame["position"].to_numpy(), startingCapital, book)
+    dataFrame["portfolio_value"] = result.portfolio_value
 
     trade_executed = dataFrame[dataFrame["position"].isin([1, -1])]
     return trade_executed
@@ -84,6 +282,92 @@ def Trade(dataFrame, startingCapital):
 # --------------------------------------------------------------------
 
 
+# --------------------------------------------------------------------
+# Parameter sweep: evaluates a grid of short/long windows in a process pool.
+# The close prices are placed in shared memory once; workers attach to it
+# instead of receiving a pickled copy.
+# def runSweep(close, shortWindows, longWindows, startingCapital, workers):
+# --------------------------------------------------------------------
+sweepMemory = None
+sweepClose = None
+
+
+def initSweepWorker(memoryName, length):
+    global sweepMemory, sweepClose
+    sweepMemory = shared_memory.SharedMemory(name=memoryName)
+    sweepClose = np.ndarray((length,), dtype=np.float64, buffer=sweepMemory.buf)
+
+
+@functools.lru_cache(maxsize=32)
+def sweepMovingAverage(window):
+    # Same rolling mean as calculateMovingAverages, cached per worker so each window is computed once.
+    return pd.Series(sweepClose, copy=False).rolling(window=window, min_periods=1).mean().to_numpy()
+
+
+def evaluateWindows(task):
+    shortWindow, longWindow, startingCapital = task
+    signal = np.where(sweepMovingAverage(shortWindow) > sweepMovingAverage(longWindow), 1.0, 0.0)
+    position = np.diff(signal, prepend=np.nan)
+    result = runBacktest(sweepClose, position, startingCapital)
+
+    equity = result.portfolio_value
+    if len(equity):
+        finalValue = equity[-1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            maxDrawdown = np.nanmax(1 - equity / np.maximum.accumulate(equity))
+    else:
+        finalValue = startingCapital
+        maxDrawdown = 0.0
+    return {
+        "short_window": shortWindow,
+        "long_window": longWindow,
+        "final_value": finalValue,
+        "return_pct": (finalValue / startingCapital - 1) * 100 if startingCapital else np.nan,
+        "trades": len(result.fill_index),
+        "max_drawdown_pct": maxDrawdown * 100,
+    }
+
+
+def runSweep(close, shortWindows, longWindows, startingCapital, workers=None):
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    tasks = [
+        (shortWindow, longWindow, startingCapital)
+        for shortWindow in shortWindows
+        for longWindow in longWindows
+        if shortWindow < longWindow
+    ]
+    workers = workers or os.cpu_count()
+
+    memory = shared_memory.SharedMemory(create=True, size=max(close.nbytes, 1))
+    try:
+        np.ndarray(close.shape, dtype=np.float64, buffer=memory.buf)[:] = close
+        with Pool(workers, initializer=initSweepWorker, initargs=(memory.name, len(close))) as pool:
+            chunkSize = max(1, len(tasks) // (workers * 4))
+            results = list(pool.imap_unordered(evaluateWindows, tasks, chunksize=chunkSize))
+    finally:
+        memory.close()
+        memory.unlink()
+
+    columns = ["short_window", "long_window", "final_value", "return_pct", "trades", "max_drawdown_pct"]
+    ranked = pd.DataFrame(results, columns=columns)
+    return ranked.sort_values("final_value", ascending=False, ignore_index=True)
+
+# --------------------------------------------------------------------
+
+
+# --------------------------------------------------------------------
+# Parses a window range given as "start:stop[:step]" (stop included) or a single value
+# --------------------------------------------------------------------
+def parseWindowRange(text):
+    parts = [int(part) for part in text.split(":")]
+    if len(parts) == 1:
+        return [parts[0]]
+    step = parts[2] if len(parts) == 3 else 1
+    return list(range(parts[0], parts[1] + 1, step))
+
+# --------------------------------------------------------------------
+
+
 # --------------------------------------------------------------------
 # Retrieves current date and time
 # --------------------------------------------------------------------
@@ -99,26 +383,73 @@ def retrieveDateandTime():
 # MAIN
 # --------------------------------------------------------------------
 def main():
-    if len(sys.argv) != 2:
+    if len(sys.argv) < 2:
         print("[ERROR] : Please provide the path to your data file.")
         sys.exit(1)
 
+    parser = argparse.ArgumentParser(description="Moving average crossover backtest.")
+    parser.add_argument("dataFile", help="CSV file with 'datetime' and 'c' columns, or a history store root")
+    parser.add_argument("--capital", type=float, help="starting capital in USD (prompted if omitted)")
+    parser.add_argument("--sweep", action="store_true", help="evaluate a grid of short/long windows")
+    parser.add_argument("--short", default="13", type=parseWindowRange, help="short windows, start:stop[:step]")
+    parser.add_argument("--long", default="48", type=parseWindowRange, help="long windows, start:stop[:step]")
+    parser.add_argument("--workers", type=int, help="worker processes for --sweep (default: all cores)")
+    parser.add_argument("--top", type=int, default=20, help="rows of the ranked sweep table to print")
+    parser.add_argument("--symbol", default="BTCUSDT", help="symbol to read from a history store")
+    parser.add_argument("--interval", default="1m", help="interval to read from a history store")
+    parser.add_argument("--start", help="first date/time of the backtest window, e.g. 2024-03-01 (UTC)")
+    parser.add_argument("--end", help="date/time the backtest window ends before (UTC)")
+    parser.add_argument("--price-dtype", default="float64", choices=["float64", "float32"],
+                        help="dtype of the price columns")
+    parser.add_argument("--memory", action="store_true", help="print the memory footprint of the loaded data")
+    parser.add_argument("--book", help="depth snapshot JSON saved by order_book.py to walk for fill prices")
+    args = parser.parse_args()
+
     print("-----------------------------------------------")
     print(f"S T A R T - {retrieveDateandTime()}")
     print("-----------------------------------------------")
 
-    dataFilePath = sys.argv[1]
-    df = getData(dataFilePath)
+    dataFilePath = args.dataFile
+    if os.path.isdir(dataFilePath):
+        df = getStoreData(dataFilePath, args.symbol, args.interval, args.start, args.end, columns=["datetime", "c"],
+                          priceDtype=args.price_dtype)
+    else:
+        df = getData(dataFilePath, columns=["datetime", "c"], priceDtype=args.price_dtype)
+        if args.start or args.end:
+            window = pd.Series(True, index=df.index)
+            if args.start:
+                window &= df["datetime"] >= pd.Timestamp(args.start)
+            if args.end:
+                window &= df["datetime"] < pd.Timestamp(args.end)
+            df = df[window].reset_index(drop=True)
+    if args.memory:
+        print(memory_report(df).to_string())
+
+    if args.capital is not None:
+        startingCapital = args.capital
+    else:
+        try:
+            startingCapital = float(input("Enter the starting capital (in USD): "))
+        except ValueError:
+            print("[ERROR] : Invalid input for capital. Please enter a numeric value.")
+            sys.exit(1)
 
-    try:
-        startingCapital = float(input("Enter the starting capital (in USD): "))
-    except ValueError:
-        print("[ERROR] : Invalid input for capital. Please enter a numeric value.")
-        sys.exit(1)
+    if args.sweep:
+        results = runSweep(df["c"].to_numpy(), args.short, args.long, startingCapital, args.workers)
+        print(results.head(args.top).to_string(index=False))
+
+        print("-----------------------------------------------")
+        print(f"D O N E - {retrieveDateandTime()}")
+        print("-----------------------------------------------")
+        return
 
-    calculateMovingAverages(df, 13, 48)
+    calculateMovingAverages(df, args.short[0], args.long[0])
     identifySignals(df)
-    df = Trade(df, startingCapital)
+    book = None
+    if args.book:
+        from order_book import load_snapshot
+        book = load_snapshot(args.book)
+    df = Trade(df, startingCapital, book)
 
     print(
         df[
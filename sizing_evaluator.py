@@ -0,0 +1,153 @@
+import argparse
+import time
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from ledger import apply_signals
+
+# Final state of every path after simulate_sizing; equity is None unless requested.
+SizingResult = namedtuple("SizingResult", ["usd_balance", "btc_balance", "total_portfolio_value", "trades", "equity"])
+
+
+def bootstrap_paths(close, paths, length, block_size=60, seed=None):
+    """Block-bootstraps the log returns of close into a (paths, length) array of price paths.
+
+    Blocks of block_size consecutive returns are drawn with replacement so short-range
+    structure such as volatility clusters survives the resampling. Every path starts
+    at the first price of close.
+    """
+    close = np.asarray(close, dtype='float64')
+    returns = np.diff(np.log(close))
+    block_size = min(block_size, len(returns))
+    rng = np.random.default_rng(seed)
+    blocks = -(-(length - 1) // block_size)
+    starts = rng.integers(0, len(returns) - block_size + 1, size=(paths, blocks))
+    index = (starts[:, :, None] + np.arange(block_size)).reshape(paths, -1)[:, :length - 1]
+    log_prices = np.concatenate([np.zeros((paths, 1)), np.cumsum(returns[index], axis=1)], axis=1)
+    return close[0] * np.exp(log_prices)
+
+
+def walk_forward_windows(close, window, step):
+    """Returns the (windows, window) array of every window-long slice of close starting each step bars."""
+    close = np.asarray(close, dtype='float64')
+    return np.lib.stride_tricks.sliding_window_view(close, window)[::step]
+
+
+def crossover_signals(paths, short_period, long_period):
+    """The v5 calculate_crossover signal (1, -1 or 0) of every bar of every path, shape (paths, bars).
+
+    The moving averages are computed by pandas over all paths at once, with the same
+    rolling window and rounding as the live scripts, so the signals match them exactly.
+    """
+    frame = pd.DataFrame(np.asarray(paths, dtype='float64').T)
+    short_ma = frame.rolling(window=short_period, min_periods=short_period).mean().round(3).to_numpy()
+    long_ma = frame.rolling(window=long_period, min_periods=long_period).mean().round(3).to_numpy()
+    prev_short_ma = np.vstack([np.full((1, short_ma.shape[1]), np.nan), short_ma[:-1]])
+    prev_long_ma = np.vstack([np.full((1, long_ma.shape[1]), np.nan), long_ma[:-1]])
+
+    signal = np.zeros(short_ma.shape, dtype='int8')
+    signal[(short_ma > long_ma) & (prev_short_ma <= prev_long_ma)] = 1
+    signal[(short_ma < long_ma) & (prev_short_ma >= prev_long_ma)] = -1
+    return np.ascontiguousarray(signal.T)
+
+
+def simulate_sizing(close, signal, usd_balance=10000, btc_balance=1, buy_trade_percentage=0.1,
+                    sell_trade_percentage=0.1, leverage=1, last_trade_signal=0, equity=False):
+    """Runs the v5 fractional sizing over every path of a (paths, bars) batch at once.
+
+    Each path follows PortfolioLedger.apply exactly (see ledger.apply_signals): a signal only trades when it differs
+    from the last one that traded, a buy spends buy_trade_percentage of the USD balance
+    and a sell sells sell_trade_percentage of the BTC balance, both scaled by leverage.
+    The sizing parameters and starting balances may be scalars or one value per path.
+    The loop runs over bars and skips bars without a signal on any path; all arithmetic
+    is vectorized across paths. With equity=True the total portfolio value after every
+    bar is returned as well, shape (paths, bars).
+    """
+    close = np.asarray(close, dtype='float64')
+    signal = np.asarray(signal)
+    paths, bars = close.shape
+
+    def per_path(value, dtype='float64'):
+        return np.array(np.broadcast_to(np.asarray(value, dtype=dtype), (paths,)))
+
+    usd = per_path(usd_balance)
+    btc = per_path(btc_balance)
+    buy_percentage = per_path(buy_trade_percentage)
+    sell_percentage = per_path(sell_trade_percentage)
+    path_leverage = per_path(leverage)
+    last_signal = per_path(last_trade_signal, dtype='int8')
+    trades = np.zeros(paths, dtype='int64')
+    curve = np.empty((paths, bars)) if equity else None
+    filled = 0  # Bars of curve already valued; balances are constant between trades
+
+    for bar in np.flatnonzero(signal.any(axis=0)):
+        bar_signal = signal[:, bar]
+        if not ((bar_signal != 0) & (bar_signal != last_signal)).any():
+            continue
+        if equity:
+            curve[:, filled:bar] = usd[:, None] + (btc[:, None] * close[:, filled:bar])
+            filled = bar
+        trades += apply_signals(usd, btc, last_signal, bar_signal, close[:, bar], buy_percentage, sell_percentage,
+                                path_leverage)
+
+    if equity:
+        curve[:, filled:] = usd[:, None] + (btc[:, None] * close[:, filled:])
+    return SizingResult(usd, btc, usd + (btc * close[:, -1]), trades, curve)
+
+
+def max_drawdown(equity):
+    """Largest peak-to-trough fall of every equity curve, as a fraction of the peak."""
+    peaks = np.maximum.accumulate(equity, axis=1)
+    return ((peaks - equity) / peaks).max(axis=1)
+
+
+def summarize(result, starting_value):
+    """Percentiles of the return, trade count and (if available) drawdown across paths."""
+    returns = result.total_portfolio_value / starting_value - 1
+    stats = {'return': returns, 'trades': result.trades}
+    if result.equity is not None:
+        stats['max_drawdown'] = max_drawdown(result.equity)
+    return pd.DataFrame({
+        name: np.percentile(values, [5, 25, 50, 75, 95]) for name, values in stats.items()
+    }, index=['p5', 'p25', 'p50', 'p75', 'p95'])
+
+
+def synthetic_close(bars, seed=0):
+    """Random-walk closes for trying the evaluator without a price file."""
+    rng = np.random.default_rng(seed)
+    return 30000 * np.exp(np.cumsum(rng.normal(0, 0.001, bars)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluates the v5 fractional sizing over many price paths at once.")
+    parser.add_argument("--file", help="CSV with a 'c' close column (a synthetic random walk if omitted)")
+    parser.add_argument("--mode", choices=["bootstrap", "walk-forward"], default="bootstrap")
+    parser.add_argument("--paths", type=int, default=1000, help="bootstrap paths")
+    parser.add_argument("--length", type=int, default=10_000, help="bars per bootstrap path")
+    parser.add_argument("--block", type=int, default=60, help="bootstrap block size in bars")
+    parser.add_argument("--window", type=int, default=10_000, help="walk-forward window in bars")
+    parser.add_argument("--step", type=int, default=1_000, help="walk-forward step in bars")
+    parser.add_argument("--short", type=int, default=5)
+    parser.add_argument("--long", type=int, default=10)
+    parser.add_argument("--usd", type=float, default=10000)
+    parser.add_argument("--btc", type=float, default=1)
+    parser.add_argument("--buy", type=float, default=0.1, help="buy_trade_percentage")
+    parser.add_argument("--sell", type=float, default=0.1, help="sell_trade_percentage")
+    parser.add_argument("--leverage", type=float, default=1)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    close = pd.read_csv(args.file, usecols=['c'])['c'].to_numpy('float64') if args.file else synthetic_close(200_000)
+    start = time.perf_counter()
+    if args.mode == "bootstrap":
+        batch = bootstrap_paths(close, args.paths, args.length, args.block, args.seed)
+    else:
+        batch = walk_forward_windows(close, args.window, args.step)
+    signal = crossover_signals(batch, args.short, args.long)
+    result = simulate_sizing(batch, signal, args.usd, args.btc, args.buy, args.sell, args.leverage, equity=True)
+    elapsed = time.perf_counter() - start
+
+    print(f"{batch.shape[0]} paths x {batch.shape[1]} bars in {elapsed:.2f}s")
+    print(summarize(result, args.usd + args.btc * batch[:, 0]).to_string())
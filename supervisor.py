@@ -0,0 +1,213 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from multi_stream import BASE_URL, SymbolState, subscribe
+
+# One published bar: the closed candle and the symbol's v5 ledger after it.
+BAR_DTYPE = np.dtype([
+    ('open_time', 'int64'),
+    ('close', 'float64'),
+    ('volume', 'float64'),
+    ('usd_balance', 'float64'),
+    ('btc_balance', 'float64'),
+    ('total_portfolio_value', 'float64'),
+])
+
+# Cross-symbol view read by SharedBars.snapshot(): the newest bar of every symbol that has
+# published one, their summed equity and base-asset exposure (btc_balance * close).
+Snapshot = namedtuple("Snapshot", ["symbols", "bars", "total_equity", "exposure", "retries"])
+
+
+class SharedBars:
+    """Ring of the newest bars per symbol in one shared memory block.
+
+    Layout: a sequence counter per symbol, a count of bars written per symbol, then a
+    (symbols, depth) array of BAR_DTYPE records. Every symbol has a single writer, which
+    makes its counter odd while it writes and even again when done (a seqlock), so
+    readers never lock and writers never wait. Create it in the supervisor and attach
+    to it by name, with the same symbols and depth, in the workers.
+    """
+
+    def __init__(self, symbols, depth=256, name=None):
+        self.symbols = list(symbols)
+        self.depth = depth
+        count = len(self.symbols)
+        size = 16 * count + BAR_DTYPE.itemsize * count * depth
+        self.owner = name is None
+        self.memory = shared_memory.SharedMemory(name=name, create=self.owner, size=size if self.owner else 0)
+        buffer = self.memory.buf
+        self.sequence = np.ndarray((count,), dtype='int64', buffer=buffer)
+        self.written = np.ndarray((count,), dtype='int64', buffer=buffer, offset=8 * count)
+        self.bars = np.ndarray((count, depth), dtype=BAR_DTYPE, buffer=buffer, offset=16 * count)
+        if self.owner:
+            self.sequence[:] = 0
+            self.written[:] = 0
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    def publish(self, slot, open_time, close, volume, usd_balance, btc_balance, total_portfolio_value):
+        """Appends one bar to the ring of the symbol at slot; only that symbol's worker may call this."""
+        self.sequence[slot] += 1  # Odd: readers retry
+        self.bars[slot, self.written[slot] % self.depth] = (open_time, close, volume, usd_balance, btc_balance,
+                                                           total_portfolio_value)
+        self.written[slot] += 1
+        self.sequence[slot] += 1
+
+    def release(self, slots):
+        """Ends writes a dead writer left half done, so a new writer of slots starts from even counters.
+
+        A bar the writer did not finish is not counted in written yet, so readers never see it.
+        """
+        for slot in slots:
+            self.sequence[slot] += self.sequence[slot] & 1
+
+    def history(self, slot):
+        """The ring of the symbol at slot as a view, in slot order rather than time order; may be torn."""
+        return self.bars[slot, :min(int(self.written[slot]), self.depth)]
+
+    def snapshot(self, max_retries=1000):
+        """Reads the newest bar of every symbol as of one instant.
+
+        The counters are read before and after; if any writer was busy or finished in
+        between the read is repeated, so all symbols come from the same moment. Only the
+        newest record of each symbol is gathered, the rings themselves are not copied.
+        """
+        rows = np.arange(len(self.symbols))
+        for retries in range(max_retries):
+            before = self.sequence.copy()
+            if (before & 1).any():
+                time.sleep(0)
+                continue
+            written = self.written.copy()
+            latest = self.bars[rows, (written - 1) % self.depth]
+            if np.array_equal(before, self.sequence):
+                live = written > 0
+                bars = latest[live]
+                exposure = float(np.sum(bars['btc_balance'] * bars['close']))
+                return Snapshot([symbol for symbol, is_live in zip(self.symbols, live) if is_live], bars,
+                                float(np.sum(bars['total_portfolio_value'])), exposure, retries)
+        raise RuntimeError(f"No consistent snapshot after {max_retries} attempts")
+
+    def close(self):
+        # Drop the views before closing, the buffer cannot be released while they exist.
+        self.sequence = self.written = self.bars = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+def shard(symbols, workers):
+    """Splits symbols round-robin into at most workers shards."""
+    return [shard for shard in (symbols[i::workers] for i in range(workers)) if shard]
+
+
+def run_worker(memory_name, symbols, depth, shard_symbols, interval, base_url, ma_periods):
+    """Worker process: ingests its shard's streams and publishes every closed bar to the shared ring."""
+    ring = SharedBars(symbols, depth, name=memory_name)
+    slots = {symbol: symbols.index(symbol) for symbol in shard_symbols}
+    states = {symbol: SymbolState(symbol, ma_periods) for symbol in shard_symbols}
+
+    def publish(state, fired):
+        if fired:
+            row = state.candles.last()
+            ring.publish(slots[state.symbol], row['timestamp'], row['c'], row['v'], row['usd_balance'],
+                         row['btc_balance'], row['total_portfolio_value'])
+
+    try:
+        asyncio.run(subscribe(states, interval, base_url, on_update=publish))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ring.close()
+
+
+class Supervisor:
+    """Runs the multi_stream pipeline for many symbols in several worker processes.
+
+    Symbols are sharded across workers so the ingest, indicator and strategy work of
+    different shards runs in parallel instead of under one GIL. Workers publish closed
+    bars and portfolio values to a SharedBars ring, which snapshot() reads without
+    pickling or queues. check() restarts workers that died.
+    """
+
+    def __init__(self, symbols, interval, workers=None, depth=256, base_url=BASE_URL, ma_periods=(5, 10)):
+        self.symbols = [symbol.upper() for symbol in symbols]
+        self.interval = interval
+        self.shards = shard(self.symbols, workers or os.cpu_count())
+        self.depth = depth
+        self.base_url = base_url
+        self.ma_periods = list(ma_periods)
+        self.ring = None
+        self.processes = []
+        self.restarts = 0
+
+    def _spawn(self, shard_symbols):
+        # A worker killed inside publish() leaves its counter odd, which would invert the seqlock for the next one.
+        self.ring.release([self.symbols.index(symbol) for symbol in shard_symbols])
+        process = multiprocessing.Process(
+            target=run_worker, name=f"worker-{shard_symbols[0]}", daemon=True,
+            args=(self.ring.name, self.symbols, self.depth, shard_symbols, self.interval, self.base_url,
+                  self.ma_periods))
+        process.start()
+        return process
+
+    def start(self):
+        self.ring = SharedBars(self.symbols, self.depth)
+        self.processes = [self._spawn(shard_symbols) for shard_symbols in self.shards]
+        return self
+
+    def check(self):
+        """Restarts every worker that exited; returns how many were restarted."""
+        restarted = 0
+        for i, process in enumerate(self.processes):
+            if not process.is_alive():
+                print(f"{process.name} exited with {process.exitcode}, restarting")
+                self.processes[i] = self._spawn(self.shards[i])
+                restarted += 1
+        self.restarts += restarted
+        return restarted
+
+    def snapshot(self):
+        return self.ring.snapshot()
+
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+
+def print_snapshot(snapshot):
+    print(f"{len(snapshot.symbols)} symbols  equity={snapshot.total_equity:.2f}  exposure={snapshot.exposure:.2f}")
+    for symbol, bar in zip(snapshot.symbols, snapshot.bars):
+        print(f"  {symbol:<12} {bar['open_time']} c={bar['close']} total={bar['total_portfolio_value']:.2f}")
+
+
+if __name__ == "__main__":
+    symbols = ["BTCUSDT", "ETHUSDT", "BNBUSDT", "SOLUSDT", "XRPUSDT", "ADAUSDT", "DOGEUSDT", "LTCUSDT"]
+    interval = "1m"
+    workers = 4
+    report_every = 10  # Seconds between aggregated snapshots
+
+    supervisor = Supervisor(symbols, interval, workers).start()
+    print(f"Streaming {len(symbols)} symbols with interval {interval} in {len(supervisor.shards)} workers")
+    try:
+        while True:
+            time.sleep(report_every)
+            supervisor.check()
+            print_snapshot(supervisor.snapshot())
+    except KeyboardInterrupt:
+        print('Interrupt received, stopping…')
+    finally:
+        supervisor.stop()
@@ -0,0 +1,247 @@
+import json
+import os
+import signal
+import sys
+
+import numpy as np
+import websocket
+
+from backfill import interval_ms
+from candle_schema import candle_columns
+from candle_store import CandleStore
+from indicators import MovingAverages
+from kline_decoder import Kline
+from kline_ingest import KlineIngestor
+from pipeline import FramePipeline
+
+try:
+    import msgspec
+except ImportError:  # msgspec is optional, orjson or the json module are used instead
+    msgspec = None
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+
+if msgspec is not None:
+    class _AggTradeEvent(msgspec.Struct):
+        s: str
+        p: float
+        q: float
+        T: int
+
+    class _CombinedAggTradeEvent(msgspec.Struct):
+        data: _AggTradeEvent
+
+    # strict=False lets msgspec parse the price strings Binance sends straight into floats.
+    _event_list_decoder = msgspec.json.Decoder(list[_AggTradeEvent], strict=False)
+    _combined_list_decoder = msgspec.json.Decoder(list[_CombinedAggTradeEvent], strict=False)
+
+    def _decode_events(frames):
+        # Joining the frames into one JSON array decodes the whole batch in a single call.
+        joined = b'[' + b','.join(frame if isinstance(frame, bytes) else frame.encode() for frame in frames) + b']'
+        if frames[0][:9] in (b'{"stream"', '{"stream"'):
+            events = [wrapper.data for wrapper in _combined_list_decoder.decode(joined)]
+        else:
+            events = _event_list_decoder.decode(joined)
+        return [(event.s, event.T, event.p, event.q) for event in events]
+
+else:
+    def _decode_events(frames):
+        events = []
+        for frame in frames:
+            event = _loads(frame)
+            event = event.get('data', event)
+            events.append((event['s'], event['T'], float(event['p']), float(event['q'])))
+        return events
+
+
+def decode_agg_trades(frames):
+    """Decodes a batch of raw @aggTrade frames into (symbols, trade times, prices, quantities) columns."""
+    if not frames:
+        return [], np.empty(0, dtype='int64'), np.empty(0), np.empty(0)
+    symbols, times, prices, quantities = zip(*_decode_events(frames))
+    return (list(symbols), np.array(times, dtype='int64'), np.array(prices, dtype='float64'),
+            np.array(quantities, dtype='float64'))
+
+
+class BarAggregator:
+    """Builds OHLCV bars of several intervals at once from one symbol's trades.
+
+    Trades are added in batches: every interval splits the batch into bars with one
+    vectorized pass (bar ids, then reduceat over the bar boundaries), so the cost is
+    per batch and per bar, not per trade. The open bar of each interval lives in
+    fixed arrays with one slot per interval. Intervals without trades produce flat
+    bars at the previous close with zero volume, like the Binance kline stream.
+    """
+
+    def __init__(self, symbol, intervals=('1s', '5s', '15s')):
+        self.symbol = symbol.upper()
+        self.intervals = list(intervals)
+        self.steps = [interval_ms(interval) for interval in self.intervals]
+        count = len(self.intervals)
+        self.bar_id = np.full(count, -1, dtype='int64')  # Open time // step of the open bar, -1 before any trade
+        self.open = np.zeros(count)
+        self.high = np.zeros(count)
+        self.low = np.zeros(count)
+        self.close = np.zeros(count)
+        self.volume = np.zeros(count)
+        self.trades = 0
+
+    def _bar(self, i, closed):
+        step = self.steps[i]
+        bar_id = int(self.bar_id[i])
+        return Kline(self.symbol, bar_id * step, bar_id * step + step - 1, float(self.open[i]), float(self.high[i]),
+                     float(self.low[i]), float(self.close[i]), float(self.volume[i]), closed, self.intervals[i])
+
+    def forming(self):
+        """The open bar of every interval that has seen a trade, as Klines with closed=False."""
+        return [self._bar(i, False) for i in range(len(self.intervals)) if self.bar_id[i] >= 0]
+
+    def add(self, times, prices, quantities):
+        """Adds trades in time order; returns the bars they closed as Klines, oldest close first."""
+        if not len(times):
+            return []
+        self.trades += len(times)
+        closed = []
+        for i, step in enumerate(self.steps):
+            ids = times // step
+            # A trade stamped before the open bar (e.g. after a reconnect) is added to the open bar.
+            np.maximum.accumulate(ids, out=ids)
+            np.maximum(ids, self.bar_id[i], out=ids)
+            starts = np.flatnonzero(ids[1:] != ids[:-1]) + 1
+            ends = np.append(starts, len(ids))
+            starts = np.insert(starts, 0, 0)
+            bar_ids = ids[starts]
+            highs = np.maximum.reduceat(prices, starts)
+            lows = np.minimum.reduceat(prices, starts)
+            volumes = np.add.reduceat(quantities, starts)
+            for bar in range(len(starts)):
+                if bar_ids[bar] == self.bar_id[i]:  # More trades of the open bar
+                    self.high[i] = max(self.high[i], highs[bar])
+                    self.low[i] = min(self.low[i], lows[bar])
+                    self.volume[i] += volumes[bar]
+                else:
+                    if self.bar_id[i] >= 0:
+                        closed.append(self._bar(i, True))
+                        previous_close = float(self.close[i])
+                        for gap_id in range(int(self.bar_id[i]) + 1, int(bar_ids[bar])):
+                            closed.append(Kline(self.symbol, gap_id * step, gap_id * step + step - 1, previous_close,
+                                                previous_close, previous_close, previous_close, 0.0, True,
+                                                self.intervals[i]))
+                    self.bar_id[i] = bar_ids[bar]
+                    self.open[i] = prices[starts[bar]]
+                    self.high[i] = highs[bar]
+                    self.low[i] = lows[bar]
+                    self.volume[i] = volumes[bar]
+                self.close[i] = prices[ends[bar] - 1]
+        if len(self.steps) > 1:
+            closed.sort(key=lambda kline: kline.close_time)
+        return closed
+
+
+class TradeBarBuilder:
+    """Turns batches of raw @aggTrade frames into bar Klines, for FramePipeline(decode=builder.decode).
+
+    Each bar carries its interval in Kline.interval. Closed bars are followed by one
+    forming update per interval and symbol when emit_forming is set, so the live
+    scripts see a closing candle and intra-candle updates just like on @kline streams.
+    """
+
+    def __init__(self, intervals=('1s', '5s', '15s'), emit_forming=True):
+        self.intervals = list(intervals)
+        self.emit_forming = emit_forming
+        self.aggregators = {}  # symbol -> BarAggregator
+
+    def aggregator(self, symbol):
+        aggregator = self.aggregators.get(symbol)
+        if aggregator is None:
+            aggregator = self.aggregators[symbol] = BarAggregator(symbol, self.intervals)
+        return aggregator
+
+    def decode(self, frames):
+        symbols, times, prices, quantities = decode_agg_trades(frames)
+        if not symbols:
+            return []
+        if symbols[0] == symbols[-1] and symbols.count(symbols[0]) == len(symbols):
+            groups = {symbols[0]: slice(None)}  # A single-symbol stream needs no grouping
+        else:
+            groups = {}
+            for index, symbol in enumerate(symbols):
+                groups.setdefault(symbol, []).append(index)
+        bars = []
+        for symbol, index in groups.items():
+            aggregator = self.aggregator(symbol)
+            bars.extend(aggregator.add(times[index], prices[index], quantities[index]))
+            if self.emit_forming:
+                bars.extend(aggregator.forming())
+        return bars
+
+
+def synthetic_trade_frames(count, symbol="BTCUSDT", trades_per_second=1000, start_time=1700000000000):
+    """Builds raw @aggTrade frames shaped like the Binance payload."""
+    frames = []
+    for i in range(count):
+        price = 60000 + (i % 500) * 0.37 - (i % 7) * 1.1
+        trade_time = start_time + i * 1000 // trades_per_second
+        frames.append(json.dumps({
+            "e": "aggTrade", "E": trade_time + 5, "s": symbol, "a": 5000 + i, "p": f"{price:.2f}", "q": "0.015",
+            "f": 9000 + i, "l": 9000 + i, "T": trade_time, "m": i % 3 == 0,
+        }).encode())
+    return frames
+
+
+def on_kline(kline):
+    ingestor = ingestors[kline.interval]
+    row = {'timestamp': kline.open_time, 'pair': kline.symbol, 'c': kline.close, 'v': kline.volume}
+    if ingestor.ingest(row, kline.closed):
+        cross = ingestor.candles.last()['cross']
+        if cross:
+            print(f"{kline.interval:>4} {kline.symbol} {kline.open_time} c={kline.close} "
+                  f"{'buy' if cross == 1 else 'sell'}")
+
+
+def on_message(ws, message):
+    pipeline.put(message)
+
+
+def on_error(ws, error):
+    print(error)
+
+
+def on_close(ws, *args, **kwargs):
+    print("Connection closed")
+    pipeline.close()
+    aggregator = builder.aggregators.get(symbol)
+    print(f"Aggregated {aggregator.trades if aggregator else 0} trades")
+
+
+def signal_handler(sig, frame):
+    print('Interrupt received, stopping…')
+    ws.close()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    symbol = "BTCUSDT"
+    intervals = ['1s', '5s', '15s']
+    stream_url = os.environ.get("BINANCE_STREAM_URL", "wss://stream.binancefuture.com/ws")
+    ma_periods = [5, 10]
+
+    # One candle store and MA/crossover state per interval, fed by the bars built from the trades.
+    ingestors = {
+        interval: KlineIngestor(CandleStore(candle_columns(('c', 'v')), capacity=10_000),
+                                MovingAverages(ma_periods), cross_column='cross', crossover_periods=ma_periods)
+        for interval in intervals
+    }
+    builder = TradeBarBuilder(intervals)
+    pipeline = FramePipeline(on_kline, decode=builder.decode)
+
+    print(f"Building {', '.join(intervals)} bars from {symbol} trades")
+    ws = websocket.WebSocketApp(f"{stream_url}/{symbol.lower()}@aggTrade", on_message=on_message,
+                                on_error=on_error, on_close=on_close)
+    signal.signal(signal.SIGINT, signal_handler)
+    ws.run_forever()